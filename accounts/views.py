@@ -3,8 +3,9 @@ from .forms import RegistrationForm
 from .models import Account
 from django.contrib import messages, auth
 from django.contrib.auth.decorators import login_required
-from carts.models import Cart, CartItem
+from carts.services import merge_guest_cart
 from carts.views import _cart_id
+from carts.cart_count import reset_cart_count
 import requests
 
 
@@ -14,7 +15,8 @@ from django.template.loader import render_to_string
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import EmailMessage
+from django.db import transaction
+from notifications.outbox import enqueue_email
 
 
 
@@ -40,47 +42,48 @@ def register(request):
             username = email.split('@')[0]  
             
 
-            # Create a new user instance using the custom user manager
-            # 'Account.objects.create_user' is a method that creates a new user instance in the database using the custom user manager defined in 'models.py'. 
-            # Note that phone number is not here. This is because in the 'models.py' file, in the function 'create_user', phone number is not a field. However, phone number is added separately.
-            user = Account.objects.create_user(
-                first_name=first_name,
-                last_name=last_name,
-                email=email,
-                username = username,
-                password=password
-            )
-
-            # Set additional user attributes
-            # 'user.phone_number' is set to the phone number provided in the registration form. This allows the user to have a phone number associated with their account.
-            # This is useful for account recovery, notifications, or any other purpose where a phone number might be needed.
-            # However, it is important to note that the phone number field is optional, as indicated by the 'blank=True' attribute in the 'Account' model.
-            user.phone_number = phone_number
-
-            # Save the form data to the database
-            user.save()
-
-
-            # USER ACTIVATION AFTER REGISTRATION:
-
-            # Get the current site domain
-            current_site = get_current_site(request)
-            mail_subject = "Please activate your account"
-
-            # 'render_to_string' is a function that renders a template with the given context data and returns the rendered HTML as a string.
-            message = render_to_string('accounts/account_verification_email.html', {
-                'user': user,
-                'domain': current_site,
-                'uid': urlsafe_base64_encode(force_bytes(user.pk)),
-                'token': default_token_generator.make_token(user),
-            })
-
-            # 'to_email' is the email address which the activation email will be sent to.
-            to_email = email
-            send_email = EmailMessage(
-                mail_subject, message, to=[to_email]
-            )
-            send_email.send()
+            # The user and their activation email are saved together: if either fails, neither is kept
+            with transaction.atomic():
+                # Create a new user instance using the custom user manager
+                # 'Account.objects.create_user' is a method that creates a new user instance in the database using the custom user manager defined in 'models.py'. 
+                # Note that phone number is not here. This is because in the 'models.py' file, in the function 'create_user', phone number is not a field. However, phone number is added separately.
+                user = Account.objects.create_user(
+                    first_name=first_name,
+                    last_name=last_name,
+                    email=email,
+                    username = username,
+                    password=password
+                )
+
+                # Set additional user attributes
+                # 'user.phone_number' is set to the phone number provided in the registration form. This allows the user to have a phone number associated with their account.
+                # This is useful for account recovery, notifications, or any other purpose where a phone number might be needed.
+                # However, it is important to note that the phone number field is optional, as indicated by the 'blank=True' attribute in the 'Account' model.
+                user.phone_number = phone_number
+
+                # Save the form data to the database
+                user.save()
+
+
+                # USER ACTIVATION AFTER REGISTRATION:
+
+                # Get the current site domain
+                current_site = get_current_site(request)
+                mail_subject = "Please activate your account"
+
+                # 'render_to_string' is a function that renders a template with the given context data and returns the rendered HTML as a string.
+                message = render_to_string('accounts/account_verification_email.html', {
+                    'user': user,
+                    'domain': current_site,
+                    'uid': urlsafe_base64_encode(force_bytes(user.pk)),
+                    'token': default_token_generator.make_token(user),
+                })
+
+                # 'to_email' is the email address which the activation email will be sent to.
+                # The email is not sent here: it is put in the outbox (see 'notifications/outbox.py') and sent by the 'send_queued_emails' command,
+                # so a slow or unreachable mail server can't slow down or break the registration.
+                to_email = email
+                enqueue_email(mail_subject, message, to=[to_email])
 
 
             # '?command=verification&email='+email' is part of the content in the user's browser url after they registered and are sent the verification email.
@@ -110,80 +113,15 @@ def login(request):
         
         # If the user is found in the database:
         if user is not None:
-            try:
-                # get the cart objects and cart_items of the user whose accounts details is found in the database from the database
-                cart = Cart.objects.get(cart_id=_cart_id(request))
-
-                is_cart_item_exists = CartItem.objects.filter(cart=cart).exists()
-
-                # BEFORE LOGGING A USER IN, CHECK IF THERE IS/ARE CART ITEMS ASSOCIATED WITH A CART OF A UNIQUE 'cart_id' AS ABOVE:
-                if is_cart_item_exists:
-
-                    # use the 'cart' alone to get the CartItem objects. 
-                    # That is 'cart_item' here is all the items in a particular cart of a unique 'cart_id' (e.g AIR JORDAN of color: blue and size: medium;  RTX SHIRT of color: red and size: small;  VIVO JEANS of color: green and size: large etc.).
-                    # This cart item is not yet linked to a user
-                    cart_item = CartItem.objects.filter(cart=cart)
-
-
-                    # GETTING THE PRODUCT VARIATION BY 'cart_id':
+            # BEFORE LOGGING A USER IN, MOVE THE ITEMS OF THEIR GUEST CART (if any) INTO THEIR OWN CART:
+            # lines holding the same product and variations as a line the user already has are added to it, the others are given to the user.
+            # 'merge_guest_cart' (in 'carts/services.py') does it in a fixed number of queries, whatever the size of the carts.
+            guest_cart_id = _cart_id(request)
+            if merge_guest_cart(guest_cart_id, user):
+                reset_cart_count(cart_id=guest_cart_id)
 
-                    product_variation = []
-
-                    # for each item(e.g Air Jordan of color: blue and size: medium of quantity: 3) in the particular cart of a unique cart_id
-                    for item in cart_item:
-
-                        # 'item.variations.all' here return all the variations of each product in the cart. (For example color: blue and size: medium  -- for RTX SHIRT)
-                        variation = item.variations.all()
-                        
-                        product_variation.append(list(variation))
-
-
-                    # FOR A USER WHO IS ABOUT TO LOG IN, GET THE Cart_Item OF THE USER TO ACCESS HIS PRODUCT VARIATION:
-                    cart_item = CartItem.objects.filter(user=user) 
-
-                    ex_var_list = [] # Stores variations of each cart item
-                    id = [] # Stores IDs of cart items
-
-                    # From the above, 'cart_item' is a collection (queryset) of CartItem objects (e.g Air Jordan of color: Black and size: Medium, Air Jordan of color: White and size: Medium, Air Jordan of color: Yellow and size: Large) that the user who is logging in has in their cart
-
-                    # Here, 'item' represents each individual CartItem during iteration (e.g. Air Jordan of color: Black and size: Medium) that the user who is about logging in has in their cart
-                    for item in cart_item:
-
-                        # this means the all the variations of each item in the cart of the user about to log in(e.g color: black, size: red, etc of product ATX Shirt that was added to cart previously by the user in the previous cart_session)
-                        existing_variation = item.variations.all()
-                        
-                        ex_var_list.append(list(existing_variation))
-
-                        id.append(item.id)
-
-                        # for each item variation in the list of variations in a given cart before log in:
-                    for pr in product_variation:
-
-                        # if an item variation(that is in the list of variations in a given cart before log in) is found in the list of item variations of a particular user(when they previously logged in and added to cart):
-                        if pr in ex_var_list:
-
-                            index = ex_var_list.index(pr)
-
-                            item_id = id[index]
-
-                            item = CartItem.objects.get(id  = item_id)
-
-                            item.quantity += 1
-
-                            item.user = user
-
-                            item.save()
-
-                            # if an item variation(that is in the list of variations in a given cart before log in) is not found in the list of item variations of a particular user(when they previously logged in and added to cart):
-                        else:
-                            cart_item = CartItem.objects.filter(cart=cart)
-
-                            for item in cart_item:
-                                item.user = user
-                                item.save()  
-                    
-            except:
-                pass
+            # the guest cart may have been merged into the user's cart, so its cached badge count is recomputed on the next page
+            reset_cart_count(user=user)
 
             # log them in
             auth.login(request, user)
@@ -271,11 +209,9 @@ def forgotPassword(request):
             })
 
             # 'to_email' is the email address which the reset_password email will be sent to.
+            # Like the activation email, it is queued in the outbox and sent by the 'send_queued_emails' command.
             to_email = email
-            send_email = EmailMessage(
-                mail_subject, message, to=[to_email]
-            )
-            send_email.send()
+            enqueue_email(mail_subject, message, to=[to_email])
 
             messages.success(request, 'Password reset email has been sent to your email address')
             return redirect('login')
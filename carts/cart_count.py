@@ -0,0 +1,134 @@
+from itertools import islice
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from django.db.models import Sum
+
+from accounts.models import Account
+from .models import Cart, CartItem
+
+
+# The cart badge shows the total quantity of items in a cart. It is shown on every page,
+# so the total is kept in the cache and adjusted by the views that change a cart,
+# instead of being summed from the CartItem table on every request.
+CART_COUNT_KEY = 'cart_count:{owner}'
+
+# Counts expire after a day so any drift repairs itself even without 'reconcile_cart_counts'.
+CART_COUNT_TIMEOUT = 60 * 60 * 24
+
+
+def cart_count_key(user=None, cart_id=None):
+    if user is not None and user.is_authenticated:
+        return CART_COUNT_KEY.format(owner=f'user:{user.pk}')
+    return CART_COUNT_KEY.format(owner=f'cart:{cart_id}')
+
+
+def _cart_items(user=None, cart_id=None):
+    if user is not None and user.is_authenticated:
+        return CartItem.objects.filter(user=user)
+    return CartItem.objects.filter(cart__cart_id=cart_id)
+
+
+def compute_cart_count(user=None, cart_id=None):
+    """
+    Sum the quantities of a cart in the database (one aggregate query).
+    """
+    return _cart_items(user, cart_id).aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def get_cart_count(user=None, cart_id=None):
+    """
+    Return the cart total from the cache, computing and caching it on a miss.
+    """
+    if (user is None or not user.is_authenticated) and not cart_id:
+        return 0
+    key = cart_count_key(user, cart_id)
+    count = cache.get(key)
+    if count is None:
+        count = compute_cart_count(user, cart_id)
+        # 'add' so a concurrent 'adjust_cart_count' is not overwritten by this older total
+        cache.add(key, count, CART_COUNT_TIMEOUT)
+    return count
+
+
+# Cache backends whose 'incr' is atomic and keeps the key's expiry. Others (e.g. the file-based cache used in
+# production) do a plain get + set, which can lose a concurrent change and resets the expiry to 5 minutes.
+ATOMIC_INCR_BACKENDS = (LocMemCache, BaseMemcachedCache, RedisCache)
+
+
+def has_atomic_incr():
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], ATOMIC_INCR_BACKENDS)
+
+
+def adjust_cart_count(delta, user=None, cart_id=None):
+    """
+    Add 'delta' (may be negative) to a cached cart total.
+    Call it after the cart change has been saved: if nothing is cached yet, or the cache backend
+    has no atomic 'incr', the total is computed from the database, which already includes the change.
+    (Two changes at the same moment can still write their totals in the wrong order with such a backend;
+    the older total then shows until the next change, 'reconcile_cart_counts' or CART_COUNT_TIMEOUT.)
+    """
+    key = cart_count_key(user, cart_id)
+    if has_atomic_incr():
+        try:
+            cache.incr(key, delta)
+            return
+        except ValueError:
+            pass
+    cache.set(key, compute_cart_count(user, cart_id), CART_COUNT_TIMEOUT)
+
+
+def reset_cart_count(user=None, cart_id=None):
+    """
+    Forget a cached cart total, e.g. after a cart has been merged or emptied.
+    """
+    cache.delete(cart_count_key(user, cart_id))
+
+
+def reconcile_cart_counts(batch_size=1000):
+    """
+    Recompute every cart total in bulk (two grouped queries) and overwrite the cache.
+    The cached totals of carts without items (e.g. emptied outside the cart views) are deleted.
+    Returns the number of cart totals 'written' and 'cleared'.
+    """
+    totals = {}
+    user_totals = (
+        CartItem.objects.filter(user__isnull=False)
+        .values_list('user_id')
+        .annotate(total=Sum('quantity'))
+    )
+    for user_id, total in user_totals.iterator(chunk_size=batch_size):
+        totals[CART_COUNT_KEY.format(owner=f'user:{user_id}')] = total
+    guest_totals = (
+        CartItem.objects.filter(user__isnull=True, cart__isnull=False)
+        .values_list('cart__cart_id')
+        .annotate(total=Sum('quantity'))
+    )
+    for cart_id, total in guest_totals.iterator(chunk_size=batch_size):
+        totals[CART_COUNT_KEY.format(owner=f'cart:{cart_id}')] = total
+
+    keys = list(totals)
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        cache.set_many({key: totals[key] for key in batch}, CART_COUNT_TIMEOUT)
+
+    # The cache can't list its keys, so go through the users and guest carts that have no items
+    empty_keys = (
+        CART_COUNT_KEY.format(owner=f'user:{user_id}')
+        for user_id in Account.objects.filter(cartitem__isnull=True).values_list('pk', flat=True).iterator(chunk_size=batch_size)
+    )
+    empty_guest_keys = (
+        CART_COUNT_KEY.format(owner=f'cart:{cart_id}')
+        for cart_id in Cart.objects.filter(cartitem__isnull=True).values_list('cart_id', flat=True).iterator(chunk_size=batch_size)
+    )
+    cleared = 0
+    for source in (empty_keys, empty_guest_keys):
+        while True:
+            batch = list(islice(source, batch_size))
+            if not batch:
+                break
+            cache.delete_many(batch)
+            cleared += len(batch)
+    return {'written': len(keys), 'cleared': cleared}
@@ -0,0 +1,40 @@
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .cart_count import cart_count_key
+from .models import Cart, CartItem
+
+
+def purge_guest_carts(days=60, batch_size=500, pause=0):
+    """
+    Delete guest carts not used (nothing added or removed) for 'days' days, with their items, 'batch_size'
+    carts per short transaction so the job can run while customers are shopping.
+    'pause' seconds are slept between batches to spread the load.
+
+    Items that already belong to a user are detached from the cart and kept.
+    Returns a Counter of deleted rows per model label (e.g. 'carts.Cart').
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted = Counter()
+    while True:
+        batch = list(
+            Cart.objects.filter(last_activity__lt=cutoff).order_by('id').values_list('id', 'cart_id')[:batch_size]
+        )
+        if not batch:
+            break
+        ids = [pk for pk, _ in batch]
+        with transaction.atomic():
+            CartItem.objects.filter(cart_id__in=ids, user__isnull=False).update(cart=None)
+            _, counts = Cart.objects.filter(id__in=ids, last_activity__lt=cutoff).delete()
+        deleted.update(counts)
+        cache.delete_many([cart_count_key(cart_id=cart_id) for _, cart_id in batch])
+        if len(batch) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted
@@ -0,0 +1,33 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from carts.cleanup import purge_guest_carts
+
+
+class Command(BaseCommand):
+    help = "Delete abandoned guest carts (and their items) in batches, reporting the rows reclaimed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=60, help="Purge carts not used (nothing added or removed) for this many days.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0, help="Seconds to wait between batches.")
+        parser.add_argument('--clear-sessions', action='store_true', help="Also delete expired sessions.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        deleted = purge_guest_carts(days=options['days'], batch_size=options['batch_size'], pause=options['pause'])
+        for label, count in sorted(deleted.items()):
+            self.stdout.write(f"{label}: {count} row(s) deleted")
+
+        if options['clear_sessions']:
+            # Same as 'manage.py clearsessions', for whichever session engine is configured
+            import_module(settings.SESSION_ENGINE).SessionStore.clear_expired()
+            self.stdout.write("Expired sessions cleared")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Reclaimed {sum(deleted.values())} row(s) in {elapsed:.2f}s."
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from carts.cart_count import reconcile_cart_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute the cached cart badge totals from the CartItem table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        counts = reconcile_cart_counts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {counts['written']} cart total(s), cleared {counts['cleared']} empty cart total(s)."
+        ))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_signatures(apps, schema_editor):
+    CartItem = apps.get_model('carts', 'CartItem')
+    variation_ids = {}
+    for owner_id, variation_id in CartItem.variations.through.objects.values_list('cartitem_id', 'variation_id'):
+        variation_ids.setdefault(owner_id, []).append(variation_id)
+    CartItem.objects.bulk_update(
+        [CartItem(pk=pk, variation_signature='-'.join(str(v) for v in sorted(set(ids)))) for pk, ids in variation_ids.items()],
+        ['variation_signature'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts', '0005_cartitem_user_alter_cartitem_cart'),
+        ('store', '0017_variationcombination_signature'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='variation_signature',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(fields=['product', 'variation_signature'], name='carts_item_sig_idx'),
+        ),
+        migrations.RunPython(backfill_signatures, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts', '0006_cartitem_variation_signature'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cart',
+            name='cart_id',
+            field=models.CharField(blank=True, db_index=True, max_length=250),
+        ),
+        migrations.AlterField(
+            model_name='cart',
+            name='date_added',
+            field=models.DateField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:05
+
+from django.db import migrations, models
+from django.db.models.functions import Cast
+
+
+def backfill_last_activity(apps, schema_editor):
+    # Existing carts have no activity date yet: use the day they were created, so old abandoned carts can still be purged
+    Cart = apps.get_model('carts', 'Cart')
+    Cart.objects.update(last_activity=Cast('date_added', models.DateTimeField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts', '0007_cart_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='last_activity',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='cart',
+            name='date_added',
+            field=models.DateField(auto_now_add=True),
+        ),
+        migrations.RunPython(backfill_last_activity, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,24 @@
 from django.db import models
-from store.models import Product, Variation
+from django.db.models.signals import m2m_changed, pre_delete, post_delete
+from django.dispatch import receiver
+from store.models import (
+    Product, Variation, pop_signature_owners, recompute_variation_signatures, remember_signature_owners,
+    update_variation_signatures,
+)
 from accounts.models import Account
 
 
 # Create your models here.
 class Cart(models.Model):
-    cart_id = models.CharField(max_length=250, blank=True)
+    # Indexed: every guest cart page looks its cart up by 'cart_id'
+    cart_id = models.CharField(max_length=250, blank=True, db_index=True)
     date_added = models.DateField(auto_now_add=True)
+    # Last time something was added to or removed from the cart ('touch'). 'purge_guest_carts' deletes the carts
+    # not used for a while by this date, so a guest still shopping with an old cart keeps it.
+    last_activity = models.DateTimeField(auto_now=True, db_index=True)
+
+    def touch(self):
+        self.save(update_fields=['last_activity'])
 
     def __str__(self):
         return self.cart_id
@@ -20,6 +32,10 @@ class CartItem(models.Model):
     # 'ManyToManyField' because a product can have many variations and a single variation can belong to multiple products.
     # These variations can be in sizes, colors etc.
     variations = models.ManyToManyField(Variation, blank=True)
+
+    # Sorted ids of 'variations' (see 'store.models.make_variation_signature'), used to find the cart line holding the same product and variations.
+    variation_signature = models.CharField(max_length=255, blank=True, default='', editable=False)
+
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, null=True)
     quantity = models.IntegerField()
 
@@ -27,11 +43,37 @@ class CartItem(models.Model):
     # - Instead of deleting items permanently, setting is_active=False allows you to "hide" them
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'variation_signature'], name='carts_item_sig_idx'),
+        ]
+
     # total for each product purchased:
+    # 'unit_price' is set on lines loaded through 'carts/services.py' and includes variation / combination prices
     def sub_total(self):
-        return self.product.price * self.quantity
+        unit_price = getattr(self, 'unit_price', None)
+        if unit_price is None:
+            unit_price = self.product.price
+        return unit_price * self.quantity
     
 
     # 'unicode' because the 'product' in 'self.product' is a dictionary and not as string so we can't use '__str__'
     def __unicode__(self):
-        return self.product
\ No newline at end of file
+        return self.product
+
+
+@receiver(m2m_changed, sender=CartItem.variations.through)
+def update_cart_item_signature(sender, instance, action, reverse, pk_set, **kwargs):
+    update_variation_signatures(CartItem, 'variation_signature', instance, action, reverse, pk_set)
+
+
+# Deleting a variation removes it from the cart items without an 'm2m_changed' signal:
+# the items that had it are found before the delete and their signatures recomputed after it
+@receiver(pre_delete, sender=Variation)
+def remember_cart_items_of_variation(sender, instance, **kwargs):
+    remember_signature_owners(CartItem, instance)
+
+
+@receiver(post_delete, sender=Variation)
+def update_cart_item_signatures_after_delete(sender, instance, **kwargs):
+    recompute_variation_signatures(CartItem, 'variation_signature', pop_signature_owners(CartItem, instance))
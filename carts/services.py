@@ -0,0 +1,120 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from store.models import Variation, VariationCombination
+from .models import CartItem
+
+
+TAX_RATE = Decimal('0.02')
+
+PRICE_FIELD = DecimalField(max_digits=15, decimal_places=2)
+
+
+def unit_price():
+    """
+    The price of one unit of a cart line, as a database expression:
+    the price of the line's variation combination if it has one, else the price of
+    one of its variations, else the product's price (0 if none is set).
+    """
+    combination_price = VariationCombination.objects.filter(
+        product=OuterRef('product'),
+        signature=OuterRef('variation_signature'),
+        price__isnull=False,
+    ).exclude(signature='').order_by('id').values('price')[:1]
+    variation_price = Variation.objects.filter(
+        cartitem=OuterRef('pk'),
+        price__isnull=False,
+    ).order_by('id').values('price')[:1]
+    return Coalesce(
+        Subquery(combination_price, output_field=PRICE_FIELD),
+        Subquery(variation_price, output_field=PRICE_FIELD),
+        F('product__price'),
+        Value(Decimal('0.00')),
+        output_field=PRICE_FIELD,
+    )
+
+
+def cart_items(user=None, cart_id=None):
+    """
+    The active lines of a user's cart (or of a guest cart), annotated with 'unit_price'.
+    """
+    if user is not None and user.is_authenticated:
+        items = CartItem.objects.filter(user=user, is_active=True)
+    elif cart_id:
+        items = CartItem.objects.filter(cart__cart_id=cart_id, is_active=True)
+    else:
+        items = CartItem.objects.none()
+    return items.annotate(unit_price=unit_price())
+
+
+def cart_summary(user=None, cart_id=None):
+    """
+    Everything the cart, checkout and payment pages show about a cart, in three queries:
+    the lines (with their products and variations) and one aggregate for the totals.
+    """
+    items = cart_items(user, cart_id)
+    totals = items.aggregate(
+        total=Sum(F('quantity') * F('unit_price'), output_field=PRICE_FIELD),
+        quantity=Sum('quantity'),
+    )
+    total = totals['total'] or Decimal('0.00')
+    tax = (total * TAX_RATE).quantize(Decimal('0.01'))
+    return {
+        'cart_items': items.select_related('product').prefetch_related('variations').order_by('id'),
+        'total': total,
+        'quantity': totals['quantity'] or 0,
+        'tax': tax,
+        'grand_total': total + tax,
+    }
+
+
+def merge_guest_cart(cart_id, user):
+    """
+    Move a guest cart's lines into a user's cart when they log in, in a fixed number of queries.
+
+    Lines are matched on (product, variation signature): a guest line matching a user line adds
+    its quantity to it and is deleted, the other guest lines are handed over to the user.
+    Returns the number of guest lines merged or moved.
+    """
+    if not cart_id:
+        return 0
+
+    with transaction.atomic():
+        guest_items = list(
+            CartItem.objects.select_for_update()
+            .filter(cart__cart_id=cart_id, user__isnull=True)
+            .order_by('id')
+            .only('id', 'product_id', 'variation_signature', 'quantity')
+        )
+        if not guest_items:
+            return 0
+        # Newest first, so if the user's cart holds a line twice the oldest one receives the guest quantities
+        user_items = {
+            (item.product_id, item.variation_signature): item
+            for item in CartItem.objects.select_for_update()
+            .filter(user=user)
+            .order_by('-id')
+            .only('id', 'product_id', 'variation_signature', 'quantity')
+        }
+
+        merged, moved, removed, updated = {}, [], [], {}
+        for item in guest_items:
+            key = (item.product_id, item.variation_signature)
+            target = user_items.get(key) or merged.get(key)
+            if target is None:
+                merged[key] = item
+                moved.append(item.id)
+            else:
+                # Same product and variations already in the cart (or twice in the guest cart): add up the quantities
+                target.quantity += item.quantity
+                updated[target.id] = target
+                removed.append(item.id)
+
+        CartItem.objects.bulk_update(updated.values(), ['quantity'])
+        CartItem.objects.filter(id__in=moved).update(user=user, cart=None)
+        CartItem.objects.filter(id__in=removed).delete()
+
+    return len(guest_items)
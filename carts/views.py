@@ -1,48 +1,81 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from store.models import Product, Variation, VariationCombination
+from store.models import Product, Variation, VariationCombination, make_variation_signature
 from .models import Cart, CartItem
+from .cart_count import adjust_cart_count
+from .services import cart_summary
 from django.http import HttpResponse
 from django.contrib.auth.decorators import login_required
-from decimal import Decimal
-
+from django.db.models import Q
+from django.conf import settings
+import uuid
+
+
+# Guest carts are identified either by the session key (CART_ID_MODE = 'session') or by a signed cookie holding
+# a random cart token (CART_ID_MODE = 'cookie', which needs no session at all).
+CART_COOKIE_NAME = 'cart_id'
+CART_COOKIE_SALT = 'carts.cart_id'
+CART_COOKIE_MAX_AGE = 60 * 60 * 24 * 60
+
+
+def _cart_id(request, create=False):
+    """
+    Return the visitor's guest cart id, or None if they don't have one yet.
+    Only 'add_cart' passes create=True, so just browsing the site never writes a session row.
+    """
+    if settings.CART_ID_MODE == 'cookie':
+        cart = getattr(request, '_cart_id', None) or request.get_signed_cookie(
+            CART_COOKIE_NAME, default=None, salt=CART_COOKIE_SALT, max_age=CART_COOKIE_MAX_AGE
+        )
+        if not cart and create:
+            # New token: '_remember_cart_id' sends it back to the browser
+            cart = uuid.uuid4().hex
+        request._cart_id = cart
+        return cart
 
-def _cart_id(request):
     cart = request.session.session_key
-    if not cart:
+    if not cart and create:
         request.session.create()
         cart = request.session.session_key
     return cart
 
+
+def _remember_cart_id(request, response):
+    # Set (or refresh) the cart cookie in 'cookie' mode
+    if settings.CART_ID_MODE == 'cookie' and getattr(request, '_cart_id', None):
+        response.set_signed_cookie(
+            CART_COOKIE_NAME, request._cart_id, salt=CART_COOKIE_SALT, max_age=CART_COOKIE_MAX_AGE,
+            secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+        )
+    return response
+
 def add_cart(request, product_id):
     current_user = request.user
     product = get_object_or_404(Product, id=product_id)
     product_variation = []
 
     if request.method == 'POST':
-        for item in request.POST:
-            key = item
-            value = request.POST[key]
-            try:
-                variation = Variation.objects.get(product=product, variation_category__iexact=key, variation_value__iexact=value)
-                product_variation.append(variation)
-            except:
-                pass
+        # Each variation select is named after its variation category (e.g. 'color': 'red').
+        # All of them are resolved in one query; keys that are not variations (e.g. the CSRF token) simply match nothing.
+        selected = Q()
+        for key, value in request.POST.items():
+            if key == 'csrfmiddlewaretoken':
+                continue
+            selected |= Q(variation_category__iexact=key, variation_value__iexact=value)
+        if selected:
+            product_variation = list(Variation.objects.filter(selected, product=product))
+
+    # The signature identifies this exact set of variations (see 'store.models.make_variation_signature')
+    signature = make_variation_signature(v.id for v in product_variation)
 
     # --- Check for valid VariationCombination if variations are selected ---
     if product_variation:
-        # Try to find a matching VariationCombination for this product and these variations
-        possible_combinations = VariationCombination.objects.filter(
+        # A matching combination has exactly the same variations, i.e. the same signature
+        found_comb = VariationCombination.objects.filter(
             product=product,
+            signature=signature,
             is_active=True,
             stock__gte=1
-        )
-        # Only keep combinations that have exactly the same variations as selected
-        found_comb = None
-        for comb in possible_combinations:
-            comb_variations = list(comb.variations.all())
-            if sorted(comb_variations, key=lambda v: v.id) == sorted(product_variation, key=lambda v: v.id):
-                found_comb = comb
-                break
+        ).exists()
         if not found_comb:
             # No valid combination exists, show error or redirect with message
             return render(request, 'stores/combination_error.html', {
@@ -50,77 +83,40 @@ def add_cart(request, product_id):
             }, status=400)
 
     # --- Existing logic for adding to cart ---
+    # The cart belongs to the user if they are logged in, else to the session's cart
     if current_user.is_authenticated:
-        is_cart_item_exists = CartItem.objects.filter(product=product, user=current_user).exists()
-        if is_cart_item_exists:
-            cart_item = CartItem.objects.filter(product=product, user=current_user)
-            ex_var_list = []
-            id = []
-            for item in cart_item:
-                existing_variation = item.variations.all()
-                ex_var_list.append(list(existing_variation))
-                id.append(item.id)
-            if product_variation in ex_var_list:
-                index = ex_var_list.index(product_variation)
-                item_id = id[index]
-                item = CartItem.objects.get(product=product, id=item_id)
-                item.quantity += 1
-                item.save()
-            else:
-                item = CartItem.objects.create(product=product, quantity=1, user=current_user)
-                if len(product_variation) > 0:
-                    item.variations.clear()
-                    item.variations.add(*product_variation)
-                item.save()
-        else:
-            cart_item = CartItem.objects.create(
-                product=product,
-                quantity=1,
-                user=current_user,
-            )
-            if len(product_variation) > 0:
-                cart_item.variations.clear()
-                cart_item.variations.add(*product_variation)
-            cart_item.save()
-        return redirect('cart')
+        owner = {'user': current_user}
     else:
-        try:
-            cart = Cart.objects.get(cart_id=_cart_id(request))
-        except Cart.DoesNotExist:
-            cart = Cart.objects.create(cart_id=_cart_id(request))
-        cart.save()
-        is_cart_item_exists = CartItem.objects.filter(product=product, cart=cart).exists()
-        if is_cart_item_exists:
-            cart_item = CartItem.objects.filter(product=product, cart=cart)
-            ex_var_list = []
-            id = []
-            for item in cart_item:
-                existing_variation = item.variations.all()
-                ex_var_list.append(list(existing_variation))
-                id.append(item.id)
-            if product_variation in ex_var_list:
-                index = ex_var_list.index(product_variation)
-                item_id = id[index]
-                item = CartItem.objects.get(product=product, id=item_id)
-                item.quantity += 1
-                item.save()
-            else:
-                item = CartItem.objects.create(product=product, quantity=1, cart=cart)
-                if len(product_variation) > 0:
-                    item.variations.clear()
-                    item.variations.add(*product_variation)
-                item.save()
-        else:
-            cart_item = CartItem.objects.create(
-                product=product,
-                quantity=1,
-                cart=cart,
-            )
-            if len(product_variation) > 0:
-                cart_item.variations.clear()
-                cart_item.variations.add(*product_variation)
-            cart_item.save()
-        return redirect('cart')
+        # The guest cart (and its id) is only created now, when something is first added to it
+        cart, created = Cart.objects.get_or_create(cart_id=_cart_id(request, create=True))
+        if not created:
+            cart.touch()  # keeps the cart from being purged while the guest is using it
+        owner = {'cart': cart}
+
+    # If the cart already holds this product with the same variations, add one to that line
+    cart_item = CartItem.objects.filter(product=product, variation_signature=signature, **owner).first()
+    if cart_item:
+        cart_item.quantity += 1
+        cart_item.save(update_fields=['quantity'])
+    else:
+        cart_item = CartItem.objects.create(
+            product=product,
+            quantity=1,
+            variation_signature=signature,
+            **owner
+        )
+        # The signature is already set, so the variations are linked directly through the join table
+        # (skipping the 'm2m_changed' receiver that would recompute it)
+        CartItem.variations.through.objects.bulk_create([
+            CartItem.variations.through(cartitem=cart_item, variation=variation)
+            for variation in product_variation
+        ])
+
+    if current_user.is_authenticated:
+        adjust_cart_count(1, user=current_user)
+    else:
+        adjust_cart_count(1, cart_id=cart.cart_id)
+    return _remember_cart_id(request, redirect('cart'))
 
 def remove_cart(request, product_id, cart_item_id):
     product = get_object_or_404(Product, id=product_id)
@@ -135,6 +131,9 @@ def remove_cart(request, product_id, cart_item_id):
             cart_item.save()
         else:
             cart_item.delete()
+        if not request.user.is_authenticated:
+            cart.touch()
+        adjust_cart_count(-1, user=request.user, cart_id=_cart_id(request))
     except:
         pass
     return redirect('cart')
@@ -146,68 +145,22 @@ def remove_cart_item(request, product_id, cart_item_id):
     else:
         cart = Cart.objects.get(cart_id=_cart_id(request))
         cart_item = CartItem.objects.get(product=product, cart=cart, id=cart_item_id)
+        cart.touch()
     cart_item.delete()
+    adjust_cart_count(-cart_item.quantity, user=request.user, cart_id=_cart_id(request))
     return redirect('cart')
 
 
-def cart(request, total=Decimal('0.00'), quantity=0, cart_items=None):
-    try:
-        tax = Decimal('0.00')
-        grand_total = Decimal('0.00')
-
-        if request.user.is_authenticated:
-            cart_items = CartItem.objects.filter(user=request.user, is_active=True)
-        else:
-            cart = Cart.objects.get(cart_id=_cart_id(request))
-            cart_items = CartItem.objects.filter(cart=cart, is_active=True)
-
-        for cart_item in cart_items:
-            total += cart_item.product.price * cart_item.quantity
-            quantity += cart_item.quantity
-
-        tax = total * Decimal('0.02')
-        grand_total = total + tax
-
-    except Cart.DoesNotExist:
-        cart_items = []
-        total = Decimal('0.00')
-        quantity = 0
-        tax = Decimal('0.00')
-        grand_total = Decimal('0.00')
-
-    context = {
-        'total': total,
-        'quantity': quantity,
-        'cart_items': cart_items,
-        'tax': tax,
-        'grand_total': grand_total,
-    }
+def cart(request):
+    # The lines, their prices (including variation / combination prices) and the totals come from 'carts/services.py'
+    if request.user.is_authenticated:
+        context = cart_summary(user=request.user)
+    else:
+        context = cart_summary(cart_id=_cart_id(request))
     return render(request, 'stores/cart.html', context)
 
 
 @login_required(login_url='login')
-def checkout(request, total=0, quantity=0, cart_items=None):
-    try:
-        tax = 0
-        grand_total = 0
-        if request.user.is_authenticated:
-            cart_items = CartItem.objects.filter(user=request.user, is_active=True)
-        else:
-            cart = Cart.objects.get(cart_id=_cart_id(request))
-            cart_items = CartItem.objects.filter(cart=cart, is_active=True)
-        for cart_item in cart_items:
-            total += (cart_item.product.price * cart_item.quantity)
-            quantity += cart_item.quantity
-        tax = total * Decimal('0.02')
-        grand_total = total + tax
-    except Cart.DoesNotExist:
-        pass
-    context = {
-        'total': total,
-        'quantity': quantity,
-        'cart_items': cart_items,
-        'tax': tax,
-        'grand_total': grand_total,
-    }
+def checkout(request):
+    context = cart_summary(user=request.user)
     return render(request, 'stores/checkout.html', context)
-    
\ No newline at end of file
@@ -1,9 +1,10 @@
-from .models import Category
+from .menu import get_menu_links
 
 
 # This context processor adds the list of categories to the context of all templates
 # It allows you to access the categories in your templates without explicitly passing them from each view.
 # This context processor is added to the 'TEMPLATES' setting in settings.py under 'context_processors'.
+# The list is cached (see 'menu.py'), so rendering the menu costs no database query and no 'reverse()' call.
 def menu_links(request):
-    links = Category.objects.all()
-    return dict(links=links)
\ No newline at end of file
+    links = get_menu_links()
+    return dict(links=links)
@@ -0,0 +1,65 @@
+import time
+
+from django.core.cache import cache
+
+from .models import Category
+
+
+# The shared cache holds a version stamp that is replaced whenever a category changes.
+# Every worker keeps its own copy of the menu and only rebuilds it when the version moves on,
+# so all gunicorn workers drop a stale menu on their next request.
+MENU_VERSION_KEY = 'category_menu:version'
+MENU_KEY = 'category_menu:{version}'
+MENU_TIMEOUT = 60 * 60 * 24
+
+_local_menu = {'version': None, 'links': None}
+
+
+def _current_version():
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        # 'add' only writes if no other worker has set the key in the meantime
+        cache.add(MENU_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def build_menu_links():
+    """
+    Load the categories in one query and resolve their URLs once.
+    """
+    return [
+        {
+            'category_name': category.category_name,
+            'slug': category.slug,
+            'url': category.get_url(),
+        }
+        for category in Category.objects.only('category_name', 'slug').order_by('id')
+    ]
+
+
+def get_menu_links():
+    """
+    Return the category menu, from this process if still current,
+    else from the shared cache, else from the database.
+    """
+    version = _current_version()
+    if _local_menu['version'] == version:
+        return _local_menu['links']
+
+    key = MENU_KEY.format(version=version)
+    links = cache.get(key)
+    if links is None:
+        links = build_menu_links()
+        cache.set(key, links, MENU_TIMEOUT)
+
+    _local_menu['version'] = version
+    _local_menu['links'] = links
+    return links
+
+
+def invalidate_menu_links():
+    """
+    Move every worker on to a new menu version.
+    """
+    cache.set(MENU_VERSION_KEY, time.time_ns(), timeout=None)
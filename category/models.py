@@ -1,5 +1,7 @@
 from django.db import models
 from django.urls import reverse
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
 
 # Create your models here.
@@ -28,4 +30,11 @@ class Category(models.Model):
     
     
     def __str__(self):
-        return self.category_name 
\ No newline at end of file
+        return self.category_name
+
+
+# Any change to a category makes every worker rebuild the cached navbar menu (see 'menu.py').
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_menu(sender, instance, **kwargs):
+    from .menu import invalidate_menu_links
+    invalidate_menu_links()
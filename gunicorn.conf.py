@@ -0,0 +1,11 @@
+# Gunicorn settings, read automatically when 'gunicorn' is started from this folder (just run: gunicorn).
+# The site is served over ASGI ('pogosmarketplace/asgi.py') by uvicorn workers, so the async PayPal views in
+# 'orders/views.py' wait for PayPal without holding a worker.
+import multiprocessing
+import os
+
+wsgi_app = 'pogosmarketplace.asgi:application'
+worker_class = 'uvicorn_worker.UvicornWorker'
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
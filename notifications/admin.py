@@ -0,0 +1,17 @@
+from django.contrib import admin
+from .models import BackInStockNotice, OutgoingEmail
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "to", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("subject", "to")
+    readonly_fields = ("created_at", "sent_at", "last_error")
+
+
+@admin.register(BackInStockNotice)
+class BackInStockNoticeAdmin(admin.ModelAdmin):
+    list_display = ("product", "user", "notified_at")
+    search_fields = ("product__product_name", "user__email")
+    readonly_fields = ("notified_at",)
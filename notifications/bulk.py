@@ -0,0 +1,91 @@
+from itertools import islice
+
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import get_template
+
+from accounts.models import Account
+from orders.models import Order
+from .models import BackInStockNotice
+
+
+def render_emails(template_name, subject, recipients, build_context, from_email=None):
+    """
+    Yield one EmailMessage per recipient, rendered from a template compiled once.
+
+    'recipients' should be a lazy iterable (e.g. 'queryset.iterator(chunk_size=...)') and
+    'build_context(recipient)' returns (to_email, template context). Messages are produced
+    one at a time, so memory use doesn't grow with the number of recipients.
+    Each message keeps its recipient in 'message.recipient' (see 'send_in_batches').
+    """
+    template = get_template(template_name)
+    for recipient in recipients:
+        to_email, context = build_context(recipient)
+        message = EmailMessage(subject, template.render(context), from_email, [to_email])
+        message.recipient = recipient
+        yield message
+
+
+def send_in_batches(messages, batch_size=500, connection=None, on_sent=None):
+    """
+    Send messages 'batch_size' at a time over one mail connection ('send_messages').
+    'on_sent(batch)' is called after each batch is sent, to record the progress: if the run
+    stops half way, the next one doesn't email the same recipients again.
+    Returns the number of messages sent.
+    """
+    connection = connection or get_connection()
+    messages = iter(messages)
+    sent = 0
+    with connection:
+        while True:
+            batch = list(islice(messages, batch_size))
+            if not batch:
+                break
+            sent += connection.send_messages(batch) or 0
+            if on_sent is not None:
+                on_sent(batch)
+    return sent
+
+
+def order_status_recipients(status, chunk_size=2000):
+    # The orders in a given status whose customer wasn't emailed about it yet, with only the fields the email uses
+    return (
+        Order.objects.filter(status=status, is_ordered=True)
+        .exclude(notified_status=status)
+        .only('order_number', 'first_name', 'email', 'status')
+        .order_by('id')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def mark_orders_notified(status):
+    """
+    An 'on_sent' callback for 'send_in_batches': records that the orders of a batch were emailed about 'status'.
+    """
+    def on_sent(batch):
+        order_ids = [message.recipient.pk for message in batch]
+        Order.objects.filter(pk__in=order_ids, status=status).update(notified_status=status)
+    return on_sent
+
+
+def back_in_stock_recipients(product, chunk_size=2000):
+    # Active customers who have the product in their cart and weren't told it is back yet
+    return (
+        Account.objects.filter(cartitem__product=product, is_active=True)
+        .exclude(backinstocknotice__product=product)
+        .distinct()
+        .only('first_name', 'email')
+        .order_by('id')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def mark_customers_notified(product):
+    """
+    An 'on_sent' callback for 'send_in_batches': records that the customers of a batch were told 'product' is back.
+    """
+    def on_sent(batch):
+        BackInStockNotice.objects.bulk_create(
+            [BackInStockNotice(product=product, user=message.recipient) for message in batch],
+            ignore_conflicts=True,
+        )
+    return on_sent
@@ -0,0 +1,69 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from notifications.bulk import (
+    back_in_stock_recipients, mark_customers_notified, mark_orders_notified, order_status_recipients, render_emails,
+    send_in_batches,
+)
+from notifications.models import BackInStockNotice
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = "Email many customers at once (order status change or back-in-stock), in batches over one connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['order-status', 'back-in-stock'])
+        parser.add_argument('--status', help="order-status: the order status to notify about (e.g. 'Accepted').")
+        parser.add_argument('--product', type=int, help="back-in-stock: the id of the product available again.")
+        parser.add_argument('--reset', action='store_true', help="back-in-stock: email again the customers already told about the product.")
+        parser.add_argument('--domain', default='localhost:8000', help="Domain used in the links of the emails.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Messages sent per 'send_messages' call.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Recipients read from the database at a time.")
+        parser.add_argument('--dry-run', action='store_true', help="Write the emails to files instead of sending them (nobody is marked as notified).")
+        parser.add_argument('--output-dir', default='sent_emails', help="Where --dry-run writes the emails.")
+
+    def handle(self, *args, **options):
+        domain = options['domain']
+        if options['kind'] == 'order-status':
+            if not options['status']:
+                raise CommandError("--status is required for order-status.")
+            dashboard_url = reverse('dashboard')
+            messages = render_emails(
+                'notifications/order_status_email.html',
+                "Your order has been updated",
+                order_status_recipients(options['status'], chunk_size=options['chunk_size']),
+                lambda order: (order.email, {'order': order, 'domain': domain, 'dashboard_url': dashboard_url}),
+            )
+            on_sent = mark_orders_notified(options['status'])
+        else:
+            try:
+                product = Product.objects.get(pk=options['product'])
+            except Product.DoesNotExist:
+                raise CommandError("--product must be the id of an existing product.")
+            if options['reset'] and not options['dry_run']:
+                BackInStockNotice.objects.filter(product=product).delete()
+            messages = render_emails(
+                'notifications/back_in_stock_email.html',
+                f"{product.product_name} is back in stock",
+                back_in_stock_recipients(product, chunk_size=options['chunk_size']),
+                lambda user: (user.email, {'user': user, 'product': product, 'domain': domain}),
+            )
+            on_sent = mark_customers_notified(product)
+
+        if options['dry_run']:
+            connection = get_connection('django.core.mail.backends.filebased.EmailBackend', file_path=options['output_dir'])
+            on_sent = None
+        else:
+            connection = get_connection()
+
+        # Progress is saved after every batch, so a run that fails half way can simply be started again
+        started = time.monotonic()
+        sent = send_in_batches(messages, batch_size=options['batch_size'], connection=connection, on_sent=on_sent)
+        elapsed = time.monotonic() - started
+        rate = sent / elapsed if elapsed else 0
+        where = f" to {options['output_dir']}" if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} email(s){where} in {elapsed:.2f}s ({rate:.1f} messages/s)."))
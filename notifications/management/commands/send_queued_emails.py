@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Send the queued emails of the outbox over one mail connection, reporting throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--retry-delay', type=int, default=60, help="Seconds before the first retry (doubled on each retry).")
+        parser.add_argument('--loop', action='store_true', help="Keep running, checking the outbox every --interval seconds.")
+        parser.add_argument('--interval', type=float, default=5)
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            stats = send_queued_emails(
+                batch_size=options['batch_size'],
+                max_attempts=options['max_attempts'],
+                retry_delay=options['retry_delay'],
+            )
+            elapsed = time.monotonic() - started
+            if any(stats.values()):
+                rate = stats['sent'] / elapsed if elapsed else 0
+                self.stdout.write(self.style.SUCCESS(
+                    f"Sent {stats['sent']}, retrying {stats['retried']}, failed {stats['failed']} "
+                    f"in {elapsed:.2f}s ({rate:.1f} messages/s)."
+                ))
+            elif not options['loop']:
+                self.stdout.write("No queued emails.")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,63 @@
+from django.db import models
+from django.utils import timezone
+
+from accounts.models import Account
+from store.models import Product
+
+
+class OutgoingEmail(models.Model):
+    """
+    An email waiting to be sent (the "outbox").
+
+    Views only add a row here (see 'notifications.outbox.enqueue_email'), so a slow or failing
+    mail server never slows down or breaks a page. The 'send_queued_emails' command sends
+    the rows over one SMTP connection and retries failures with a growing delay.
+    """
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS = (
+        (QUEUED, 'Queued'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # The sender picks the due messages: WHERE status = 'queued' AND next_attempt_at <= now
+            models.Index(fields=['status', 'next_attempt_at'], name='notifications_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+
+class BackInStockNotice(models.Model):
+    """
+    A customer who was emailed that a product is back in stock ('notify_customers back-in-stock'),
+    so a new run for the same product skips them ('--reset' forgets the notices of the product).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    user = models.ForeignKey(Account, on_delete=models.CASCADE)
+    notified_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'user'], name='notifications_notice_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product} -> {self.user}"
@@ -0,0 +1,134 @@
+import logging
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+logger = logging.getLogger(__name__)
+
+# A message claimed by a sender that died is picked up again after this long
+SENDING_TIMEOUT = timedelta(minutes=10)
+
+
+def enqueue_email(subject, body, to, from_email=''):
+    """
+    Queue an email for 'send_queued_emails'. Call it inside the transaction that makes the
+    email necessary (e.g. the user's creation), so the email is only sent if it commits.
+    """
+    if isinstance(to, str):
+        to = [to]
+    return OutgoingEmail.objects.create(subject=subject, body=body, to=list(to), from_email=from_email or '')
+
+
+def _claim_batch(batch_size):
+    """
+    Mark up to 'batch_size' due messages as 'sending' and return them. 'skip_locked' lets several
+    senders run at once without picking the same messages (where the database supports it).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=OutgoingEmail.QUEUED, next_attempt_at__lte=now)
+                | Q(status=OutgoingEmail.SENDING, next_attempt_at__lte=now - SENDING_TIMEOUT)
+            )
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+            status=OutgoingEmail.SENDING, next_attempt_at=now
+        )
+        for email in batch:
+            email.status, email.next_attempt_at = OutgoingEmail.SENDING, now
+    return batch
+
+
+def _record_failure(email, error, now, max_attempts, retry_delay, stats):
+    """Count a failed try of 'email': schedule a retry with backoff, or mark it 'failed'."""
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = OutgoingEmail.FAILED
+        stats['failed'] += 1
+    else:
+        email.status = OutgoingEmail.QUEUED
+        email.next_attempt_at = now + timedelta(seconds=retry_delay * 2 ** (email.attempts - 1))
+        stats['retried'] += 1
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception as error:
+        logger.warning("Could not close the mail connection: %s", error)
+
+
+def send_queued_emails(batch_size=100, max_attempts=5, retry_delay=60, connection=None):
+    """
+    Send every due message of the outbox, 'batch_size' at a time, over one mail connection.
+
+    A message that fails is tried again after retry_delay, 2 x retry_delay, 4 x retry_delay...
+    seconds, and marked 'failed' after 'max_attempts' tries. If the mail server can't be reached,
+    the rest of the batch is counted as a failed try too and the run stops there.
+    Returns a dict with the number of messages 'sent', 'retried' and 'failed'.
+    """
+    stats = {'sent': 0, 'retried': 0, 'failed': 0}
+    connection = connection or get_connection()
+    is_open = False
+    try:
+        while True:
+            batch = _claim_batch(batch_size)
+            if not batch:
+                break
+            unreachable = False
+            try:
+                for index, email in enumerate(batch):
+                    now = timezone.now()
+                    # Connect on the first message (and again after an error)
+                    if not is_open:
+                        try:
+                            connection.open()
+                            is_open = True
+                        except Exception as error:
+                            logger.warning("Could not connect to the mail server: %s", error)
+                            for pending in batch[index:]:
+                                _record_failure(pending, error, now, max_attempts, retry_delay, stats)
+                            unreachable = True
+                            break
+                    message = EmailMessage(
+                        email.subject, email.body, email.from_email or None, email.to, connection=connection
+                    )
+                    try:
+                        connection.send_messages([message])
+                    except Exception as error:
+                        logger.warning("Could not send email %s: %s", email.pk, error)
+                        _record_failure(email, error, now, max_attempts, retry_delay, stats)
+                        # The connection may be broken after an error: reconnect for the next message
+                        _close_quietly(connection)
+                        is_open = False
+                    else:
+                        email.attempts += 1
+                        email.status = OutgoingEmail.SENT
+                        email.sent_at = now
+                        stats['sent'] += 1
+                        # Saved right away: a delivered message must not be sent again, even if this process dies
+                        OutgoingEmail.objects.filter(pk=email.pk).update(
+                            status=email.status, attempts=email.attempts, sent_at=now
+                        )
+            finally:
+                # Save what happened to each message even if the loop was interrupted, so a message
+                # already delivered is never left 'sending' (and sent again after SENDING_TIMEOUT)
+                OutgoingEmail.objects.bulk_update(
+                    batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+                )
+            if unreachable:
+                break
+    finally:
+        if is_open:
+            _close_quietly(connection)
+    return stats
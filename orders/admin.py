@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, Payment, OrderProduct
+from .models import Order, Payment, OrderProduct, PaymentCapture
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -17,4 +17,11 @@ class PaymentAdmin(admin.ModelAdmin):
 class OrderProductAdmin(admin.ModelAdmin):
     list_display = ("order", "product", "user", "quantity", "product_price", "ordered", "created_at")
     list_filter = ("ordered", "created_at")
-    search_fields = ("order__order_number", "product__product_name", "user__email", "user__username")
\ No newline at end of file
+    search_fields = ("order__order_number", "product__product_name", "user__email", "user__username")
+
+@admin.register(PaymentCapture)
+class PaymentCaptureAdmin(admin.ModelAdmin):
+    list_display = ("paypal_order_id", "status", "response_status", "created_at", "updated_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("paypal_order_id",)
+    readonly_fields = ("paypal_order_id", "status", "response", "response_status", "created_at", "updated_at")
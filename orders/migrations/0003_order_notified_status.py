@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_paymentcapture'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='notified_status',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+    ]
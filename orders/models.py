@@ -48,6 +48,8 @@ class Order(models.Model):
     order_total = models.DecimalField(max_digits=10, decimal_places=2)
     tax = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS, default='New')
+    # The last status the customer was emailed about ('notify_customers order-status'), so a new run skips them
+    notified_status = models.CharField(max_length=20, blank=True, default='')
     ip = models.GenericIPAddressField(blank=True, null=True)
     is_ordered = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -84,4 +86,33 @@ class OrderProduct(models.Model):
         return self.variations.count() == 1
 
     def is_variation_combination(self):
-        return
\ No newline at end of file
+        return
+
+
+class PaymentCapture(models.Model):
+    """
+    Ledger of PayPal capture requests, one row per PayPal order.
+
+    The capture view claims the row before calling PayPal, and the transaction that records
+    the payment and takes the stock only runs if it moves the row from 'processing' to
+    'completed', so a retried or repeated capture never takes the stock twice. Once completed,
+    repeated calls are answered with the stored response.
+    """
+    PROCESSING = 'processing'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS = (
+        (PROCESSING, 'Processing'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    )
+
+    paypal_order_id = models.CharField(max_length=50, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS, default=PROCESSING)
+    response = models.JSONField(blank=True, null=True)
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.paypal_order_id} ({self.status})"
@@ -0,0 +1,186 @@
+import asyncio
+import time
+import uuid
+import weakref
+
+import httpx
+from django.conf import settings
+
+
+def order_payload(amount, currency_code="USD"):
+    return {
+        "intent": "CAPTURE",
+        "purchase_units": [{
+            "amount": {
+                "currency_code": currency_code,
+                "value": f"{amount:.2f}",
+            }
+        }],
+    }
+
+
+_shared_ssl_context = None
+
+
+def _ssl_context():
+    # Building an SSL context (loading the CA certificates) takes ~50 ms: do it once per process
+    global _shared_ssl_context
+    if _shared_ssl_context is None:
+        _shared_ssl_context = httpx.create_ssl_context()
+    return _shared_ssl_context
+
+
+class AsyncPayPalClient:
+    """
+    Talks to the PayPal REST API from the async views, over an 'httpx.AsyncClient'.
+
+    While a call waits for PayPal the event loop serves other requests, so a slow gateway
+    holds no worker. Every call has connect / read timeouts; connection errors are retried by
+    the transport and 429 / 5xx answers here, a bounded number of times with exponential backoff.
+    Order calls send a 'PayPal-Request-Id', so PayPal treats a retried call as the same request
+    instead of creating or capturing twice.
+
+    The views share one client per event loop (see 'async_client'), so its connections to PayPal
+    are kept alive between requests. The OAuth access token is shared by all clients of the process
+    and refreshed 'TOKEN_REFRESH_MARGIN' seconds before PayPal expires it, so a request usually
+    makes a single call to PayPal.
+    """
+    TOKEN_REFRESH_MARGIN = 60
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    _token = None
+    _token_expires_at = 0
+    # One lock per event loop guards the refresh of the shared token (an asyncio.Lock belongs to one loop)
+    _token_locks = weakref.WeakKeyDictionary()
+
+    def __init__(self, api_base, client_id, secret, timeout=(3.05, 20), max_retries=2, backoff_factor=0.5):
+        self.api_base = (api_base or '').rstrip('/')
+        self.client_id = client_id
+        self.secret = secret
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        connect_timeout, read_timeout = timeout
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            transport=httpx.AsyncHTTPTransport(retries=max_retries, verify=_ssl_context()),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    @classmethod
+    def _token_lock(cls):
+        loop = asyncio.get_running_loop()
+        lock = cls._token_locks.get(loop)
+        if lock is None:
+            lock = cls._token_locks[loop] = asyncio.Lock()
+        return lock
+
+    async def _send(self, url, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            response = await self.client.post(url, **kwargs)
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+
+    async def access_token(self):
+        """
+        Return a valid access token, asking PayPal for a new one only when the cached one
+        is about to expire. Returns None if PayPal refuses the credentials.
+        Concurrent requests of an event loop wait for a single refresh.
+        """
+        cls = type(self)
+        if cls._token and time.monotonic() < cls._token_expires_at:
+            return cls._token
+        async with self._token_lock():
+            if cls._token and time.monotonic() < cls._token_expires_at:
+                return cls._token
+            response = await self._send(
+                f"{self.api_base}/v1/oauth2/token",
+                headers={"Accept": "application/json"},
+                data={"grant_type": "client_credentials"},
+                auth=(self.client_id, self.secret),
+            )
+            try:
+                data = response.json()
+            except ValueError:
+                data = {}
+            token = data.get("access_token")
+            if token:
+                cls._token = token
+                cls._token_expires_at = time.monotonic() + int(data.get("expires_in", 0)) - self.TOKEN_REFRESH_MARGIN
+            return token
+
+    def forget_token(self):
+        cls = type(self)
+        cls._token = None
+        cls._token_expires_at = 0
+
+    async def post(self, path, json=None, request_id=None):
+        """
+        POST to the API with the cached token. If PayPal answers 401 (e.g. the token was
+        revoked), the token is refreshed once and the call repeated.
+        """
+        request_id = request_id or str(uuid.uuid4())
+        for attempt in range(2):
+            token = await self.access_token()
+            response = await self._send(
+                f"{self.api_base}{path}",
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {token}",
+                    "PayPal-Request-Id": request_id,
+                },
+                json=json,
+            )
+            if response.status_code != 401 or attempt:
+                return response
+            self.forget_token()
+        return response
+
+    async def create_order(self, amount, currency_code="USD", request_id=None):
+        return await self.post("/v2/checkout/orders", json=order_payload(amount, currency_code), request_id=request_id)
+
+    async def capture_order(self, paypal_order_id, request_id=None):
+        # The same PayPal order always gets the same request id, so a repeated capture is not charged twice
+        return await self.post(
+            f"/v2/checkout/orders/{paypal_order_id}/capture",
+            request_id=request_id or f"capture-{paypal_order_id}",
+        )
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def async_client():
+    """
+    The AsyncPayPalClient of the running event loop, built from the PAYPAL_* settings.
+    A uvicorn worker runs one loop, so all its requests share one connection pool.
+    (An httpx client can't be shared between loops.) Closed by 'aclose_clients'.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncPayPalClient(
+            api_base=settings.PAYPAL_API_BASE,
+            client_id=settings.PAYPAL_CLIENT_ID,
+            secret=settings.PAYPAL_SECRET,
+            timeout=(settings.PAYPAL_CONNECT_TIMEOUT, settings.PAYPAL_READ_TIMEOUT),
+            max_retries=settings.PAYPAL_MAX_RETRIES,
+        )
+    return client
+
+
+async def aclose_clients():
+    """
+    Close the client of the running event loop, when the server shuts down (see 'pogosmarketplace/asgi.py').
+    """
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
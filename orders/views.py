@@ -1,17 +1,21 @@
 from django.shortcuts import render, redirect
 from django.http import HttpResponse, JsonResponse
 from carts.models import CartItem
+from carts.cart_count import reset_cart_count
+from carts.services import cart_summary, unit_price
 from .forms import OrderForm
-from .models import Order, Payment, OrderProduct
-from store.models import Product, Variation, VariationCombination
+from .models import Order, Payment, OrderProduct, PaymentCapture
+from store.inventory import deduct_stock, stock_lines
 import datetime
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.db import transaction
-import json, requests
-from django.db.models import Count
-from decimal import Decimal
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.utils import timezone
+import json
+from . import paypal
 
 
 
@@ -46,51 +50,12 @@ def save_payment_data(request):
         order.is_ordered = True
         order.save()
 
-        # (3) Deduct stock based on product type
-        for item in cart_items:
-            product = item.product
-            quantity = item.quantity
-            variations = item.variations.all()
-            var_count = variations.count()
-
-            if var_count == 0:
-                # SINGLE PRODUCT
-                product.stock -= quantity
-                product.save()
-
-            elif var_count == 1:
-                # PRODUCT WITH ONE VARIATION
-                variation = variations.first()
-                variation.stock -= quantity
-                variation.save()
-
-                # Update total product stock from all related variations
-                total_stock = sum(v.stock for v in Variation.objects.filter(product=product))
-                product.stock = total_stock
-                product.save()
-
-            else:
-                # PRODUCT WITH VARIATION COMBINATION
-                combo = VariationCombination.objects.filter(
-                    product=product,
-                    variations__in=variations
-                ).annotate(
-                    match_count=Count("variations")
-                ).filter(
-                    match_count=var_count
-                ).first()
-
-                if combo:
-                    combo.stock -= quantity
-                    combo.save()
-
-                    # Update total product stock from all related combinations
-                    total_combo_stock = sum(c.stock for c in VariationCombination.objects.filter(product=product))
-                    product.stock = total_combo_stock
-                    product.save()
+        # (3) Deduct stock based on product type, for all the cart lines at once
+        deduct_stock(stock_lines(cart_items))
 
         # (4) Clear cart
         cart_items.delete()
+        reset_cart_count(user=request.user)
 
         return JsonResponse({'payment_id': payment.transaction_id, 'status': payment.status})
 
@@ -99,43 +64,60 @@ def save_payment_data(request):
 def move_cart_items_to_order(user, order):
     """
     Transfers CartItems to OrderProduct table after successful payment and ensures proper deletion.
+    Runs a fixed number of queries whatever the number of lines: one read of the cart lines (with their
+    prices), one of their variations, one bulk insert of the order lines, one of their variations, and one delete.
     """
-    cart_items = CartItem.objects.filter(user=user)
-    if cart_items.exists():
-        for item in cart_items:
-            order_product = OrderProduct.objects.create(
+    Link = OrderProduct.variations.through
+    with transaction.atomic():
+        cart_items = list(
+            CartItem.objects.filter(user=user)
+            .annotate(unit_price=unit_price())
+            .order_by('id')
+            .only('id', 'product_id', 'quantity')
+        )
+        if not cart_items:
+            return True
+
+        variation_ids = {item.id: [] for item in cart_items}
+        for cart_item_id, variation_id in CartItem.variations.through.objects.filter(
+            cartitem_id__in=variation_ids
+        ).values_list('cartitem_id', 'variation_id'):
+            variation_ids[cart_item_id].append(variation_id)
+
+        order_products = OrderProduct.objects.bulk_create([
+            OrderProduct(
                 order=order,
                 user=user,
-                product=item.product,
+                product_id=item.product_id,
                 quantity=item.quantity,
-                product_price=item.product.price,
+                product_price=item.unit_price,
                 ordered=True,
             )
-            order_product.variations.set(item.variations.all())
-            item.is_active = False
-            item.save()
-            item.delete()
+            for item in cart_items
+        ])
+        Link.objects.bulk_create([
+            Link(orderproduct_id=order_product.pk, variation_id=variation_id)
+            for order_product, item in zip(order_products, cart_items)
+            for variation_id in variation_ids[item.id]
+        ])
+
+        CartItem.objects.filter(id__in=variation_ids).delete()
+    reset_cart_count(user=user)
     return True
 
 
-def place_order(request, total=Decimal('0.00'), quantity=0):
+def place_order(request):
     current_user = request.user
-    cart_items = CartItem.objects.filter(user=current_user)
-    cart_count = cart_items.count()
-
-    if cart_count <= 0:
+    # The cart lines and totals, computed the same way as on the cart and checkout pages
+    summary = cart_summary(user=current_user)
+    cart_items = summary['cart_items']
+    total = summary['total']
+    tax = summary['tax']
+    grand_total = summary['grand_total']
+
+    if summary['quantity'] <= 0:
         return redirect('store')
 
-    grand_total = Decimal('0.00')
-    tax = Decimal('0.00')
-
-    for cart_item in cart_items:
-        total += cart_item.product.price * cart_item.quantity
-        quantity += cart_item.quantity
-
-    tax = total * Decimal('0.02')
-    grand_total = total + tax
-
     if request.method == 'POST':
         form = OrderForm(request.POST)
         if form.is_valid():
@@ -184,145 +166,151 @@ def place_order(request, total=Decimal('0.00'), quantity=0):
     else:
         return redirect('checkout')
 
-def get_paypal_access_token():
-    response = requests.post(
-        f"{settings.PAYPAL_API_BASE}/v1/oauth2/token",
-        headers={"Accept": "application/json"},
-        data={"grant_type": "client_credentials"},
-        auth=(settings.PAYPAL_CLIENT_ID, settings.PAYPAL_SECRET),
-    )
-    return response.json().get("access_token")
-
+# The two PayPal views below are async: while they wait for PayPal, the server's event loop keeps serving other requests
+# instead of a worker being blocked. The site is served over ASGI for this (see 'gunicorn.conf.py').
+# The database work is done with Django's async ORM methods ('alatest', 'asave') or in 'sync_to_async'.
 @csrf_exempt
-def create_paypal_order(request):
-    current_user = request.user
+async def create_paypal_order(request):
+    current_user = await request.auser()
     try:
-        order = Order.objects.filter(user=current_user, is_ordered=False).latest("created_at")
+        order = await Order.objects.filter(user=current_user, is_ordered=False).alatest("created_at")
         grand_total = order.order_total
     except Order.DoesNotExist:
         return JsonResponse({'error': 'Order not found'}, status=404)
-    token = get_paypal_access_token()
-    order_data = {
-        "intent": "CAPTURE",
-        "purchase_units": [{
-            "amount": {
-                "currency_code": "USD",
-                "value": f"{grand_total:.2f}"
-            }
-        }]
-    }
-    response = requests.post(
-        f"{settings.PAYPAL_API_BASE}/v2/checkout/orders",
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {token}"
-        },
-        json=order_data
-    )
+    # The PayPal client is shared by the requests of this worker and keeps its connections open (see 'orders/paypal.py').
+    # The request id makes a repeated call for the same order return the same PayPal order.
+    client = paypal.async_client()
+    response = await client.create_order(grand_total, request_id=f"create-{order.order_number}")
     response_data = response.json()
     if response.status_code == 201:
         paypal_order_id = response_data["id"]
-        order = Order.objects.filter(user=request.user, is_ordered=False).latest("created_at")
         order.paypal_order_id = paypal_order_id
-        order.save()
+        await order.asave(update_fields=['paypal_order_id'])
         return JsonResponse({"paypal_order_id": paypal_order_id})
     else:
         return JsonResponse({"error": "Failed to create PayPal order", "details": response_data}, status=400)
 
-@csrf_exempt
-def capture_paypal_order(request, order_id):
-    token = get_paypal_access_token()
-    if not token:
-        return JsonResponse({"error": "Failed to authenticate with PayPal"}, status=500)
-    response = requests.post(
-        f"{settings.PAYPAL_API_BASE}/v2/checkout/orders/{order_id}/capture",
-        headers={"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
+
+# A claim left 'processing' this long (e.g. by a request that crashed) may be taken over by a new capture request
+STALE_CAPTURE_CLAIM = datetime.timedelta(minutes=2)
+
+
+def claim_capture(paypal_order_id):
+    """
+    Claim the right to capture a PayPal order (see 'PaymentCapture').
+    Returns None if this request may go on, else the (response body, HTTP status) to answer with:
+    the stored response of a completed capture, or 409 while another request is capturing.
+    Both are one lookup on the unique PayPal order id.
+    """
+    capture, created = PaymentCapture.objects.get_or_create(paypal_order_id=paypal_order_id)
+    if created:
+        return None
+    if capture.status == PaymentCapture.COMPLETED:
+        return capture.response, capture.response_status
+
+    # A failed capture may be retried. The conditional UPDATE makes sure only one request gets the claim.
+    now = timezone.now()
+    claimed = PaymentCapture.objects.filter(pk=capture.pk).filter(
+        Q(status=PaymentCapture.FAILED) | Q(status=PaymentCapture.PROCESSING, updated_at__lt=now - STALE_CAPTURE_CLAIM)
+    ).update(status=PaymentCapture.PROCESSING, updated_at=now)
+    if claimed:
+        return None
+    return {"error": "This payment is already being captured."}, 409
+
+
+def fail_capture(paypal_order_id, body, status):
+    # Release the claim so the capture can be tried again
+    PaymentCapture.objects.filter(paypal_order_id=paypal_order_id, status=PaymentCapture.PROCESSING).update(
+        status=PaymentCapture.FAILED, response=body, response_status=status, updated_at=timezone.now()
     )
-    response_data = response.json()
+    return body, status
+
+
+def record_capture(paypal_order_id, response_data):
+    """
+    Save a PayPal capture answer: create the Payment and, if the payment is complete, move the
+    cart to the order and take the stock, all in one transaction.
+    Returns (response body, HTTP status) for the capture view.
+    """
+    captures = response_data.get("purchase_units", [{}])[0].get("payments", {}).get("captures", [])
+    if not captures:
+        return fail_capture(paypal_order_id, {"error": "Payment ID not found in PayPal response."}, 500)
+    payment_id = captures[0].get("id", "UNKNOWN")
+    payment_status = response_data.get("status", "FAILED")
+    amount_paid = captures[0].get("amount", {}).get("value", 0)
+    order = Order.objects.filter(paypal_order_id=paypal_order_id).first()
+    if not order:
+        return fail_capture(paypal_order_id, {"error": "Order not found in the database."}, 404)
+    with transaction.atomic():
+        # Only the request holding the claim gets past this UPDATE (it also locks the ledger row until the
+        # transaction ends), so the payment is recorded and the stock taken exactly once
+        claimed = PaymentCapture.objects.filter(
+            paypal_order_id=paypal_order_id, status=PaymentCapture.PROCESSING
+        ).update(status=PaymentCapture.COMPLETED, updated_at=timezone.now())
+        if not claimed:
+            capture = PaymentCapture.objects.get(paypal_order_id=paypal_order_id)
+            return capture.response, capture.response_status
+
+        order.transaction_id = payment_id
+        if payment_status == "COMPLETED":
+            order.status = "Completed"
+            order.is_ordered = True
+            move_cart_items_to_order(order.user, order)
+            order_products = OrderProduct.objects.filter(order=order)
+
+            # Take the stock of every ordered line in one locked, batched transaction
+            deduct_stock(stock_lines(order_products))
+        payment = Payment.objects.create(
+            user=order.user,
+            paypal_order_id=order.paypal_order_id,
+            transaction_id=payment_id,
+            payment_method="PayPal",
+            order_total=order.order_total,
+            amount_paid=amount_paid,
+            status=payment_status
+        )
+        # The order lines already carry their variations (see 'move_cart_items_to_order')
+        OrderProduct.objects.filter(order=order).update(payment=payment)
+        order.payment = payment
+        order.save()
+
+        body = {
+            "message": "Payment captured successfully!",
+            "order_id": paypal_order_id,
+            "status": payment_status,
+            "payment_id": payment_id
+        }
+        # Repeated capture calls for this PayPal order get this same answer
+        PaymentCapture.objects.filter(paypal_order_id=paypal_order_id).update(response=body, response_status=200)
+    return body, 200
+
+
+@csrf_exempt
+async def capture_paypal_order(request, order_id):
+    # A repeated call (e.g. the browser retrying) gets the stored answer, and never takes the stock again
+    answer = await sync_to_async(claim_capture)(order_id)
+    if answer is not None:
+        body, status = answer
+        return JsonResponse(body, status=status)
+
+    try:
+        client = paypal.async_client()
+        if not await client.access_token():
+            body, status = await sync_to_async(fail_capture)(order_id, {"error": "Failed to authenticate with PayPal"}, 500)
+            return JsonResponse(body, status=status)
+        response = await client.capture_order(order_id)
+        response_data = response.json()
+    except Exception:
+        await sync_to_async(fail_capture)(order_id, {"error": "PayPal could not be reached"}, 502)
+        raise
+
     if response.status_code == 201:
-        captures = response_data.get("purchase_units", [{}])[0].get("payments", {}).get("captures", [])
-        if captures:
-            payment_id = captures[0].get("id", "UNKNOWN")
-            payment_status = response_data.get("status", "FAILED")
-            amount_paid = captures[0].get("amount", {}).get("value", 0)
-            order = Order.objects.filter(paypal_order_id=order_id).first()
-            if not order:
-                return JsonResponse({"error": "Order not found in the database."}, status=404)
-            with transaction.atomic():
-                order.transaction_id = payment_id
-                if payment_status == "COMPLETED":
-                    order.status = "Completed"
-                    order.is_ordered = True
-                    move_cart_items_to_order(order.user, order)
-                    order_products = OrderProduct.objects.filter(order=order)
-
-                    for order_product in order_products:
-                        product = order_product.product
-                        quantity = order_product.quantity
-                        variations = order_product.variations.all()
-                        var_count = variations.count()
-
-                        if var_count == 0:
-                            # Single product
-                            if product.stock >= quantity:
-                                product.stock -= quantity
-                                product.save()
-
-                        elif var_count == 1:
-                            # Product with one variation
-                            variation = variations.first()
-                            if variation.stock >= quantity:
-                                variation.stock -= quantity
-                                variation.save()
-
-                                # Update total product stock from all variations
-                                total_var_stock = sum(v.stock for v in Variation.objects.filter(product=product))
-                                product.stock = total_var_stock
-                                product.save()
-
-                        else:
-                            # Product with variation combination
-                            combo = VariationCombination.objects.filter(
-                                product=product,
-                                variations__in=variations
-                            ).annotate(match=Count('variations')).filter(match=var_count).first()
-
-                            if combo and combo.stock >= quantity:
-                                combo.stock -= quantity
-                                combo.save()
-
-                                # Update total product stock from all combinations
-                                total_combo_stock = sum(c.stock for c in VariationCombination.objects.filter(product=product))
-                                product.stock = total_combo_stock
-                                product.save()
-
-                    if request.session.get("cart_id"):
-                        del request.session["cart_id"]
-                        request.session.modified = True
-                payment = Payment.objects.create(
-                    user=order.user,
-                    paypal_order_id=order.paypal_order_id,
-                    transaction_id=payment_id,
-                    payment_method="PayPal",
-                    order_total=order.order_total,
-                    amount_paid=amount_paid,
-                    status=payment_status
-                )
-                order_products.update(payment=payment)
-                for order_product in order_products:
-                    cart_item = CartItem.objects.filter(user=order.user, product=order_product.product).first()
-                    if cart_item:
-                        order_product.variations.set(cart_item.variations.all())
-                order.payment = payment
-                order.save()
-            return JsonResponse({
-                "message": "Payment captured successfully!",
-                "order_id": order_id,
-                "status": payment_status,
-                "payment_id": payment_id
-            })
-        return JsonResponse({"error": "Payment ID not found in PayPal response."}, status=500)
-    return JsonResponse({"error": "Failed to capture PayPal order", "details": response_data}, status=response.status_code)
+        body, status = await sync_to_async(record_capture)(order_id, response_data)
+    else:
+        body, status = await sync_to_async(fail_capture)(
+            order_id, {"error": "Failed to capture PayPal order", "details": response_data}, response.status_code
+        )
+    return JsonResponse(body, status=status)
 
 def success(request):
     return render(request, "orders/success.html")
\ No newline at end of file
@@ -13,4 +13,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pogosmarketplace.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from orders import paypal  # noqa: E402  (needs the apps loaded by get_asgi_application)
+
+
+async def application(scope, receive, send):
+    # Django doesn't handle the ASGI 'lifespan' messages, so they are answered here:
+    # when the server stops, the worker's PayPal connections are closed (see 'orders/paypal.py').
+    if scope['type'] != 'lifespan':
+        return await django_application(scope, receive, send)
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await paypal.aclose_clients()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
@@ -76,6 +76,7 @@ INSTALLED_APPS = [
     'store',
     'carts',
     'orders',
+    'notifications',
 ]
 
 MIDDLEWARE = [
@@ -113,6 +114,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'pogosmarketplace.wsgi.application'
 
+# The PayPal views in 'orders/views.py' are async, so the site is deployed over ASGI: 'gunicorn.conf.py' runs this
+# application with uvicorn workers, which let slow PayPal calls wait without holding a worker. ('WSGI_APPLICATION' above is still used by 'runserver'.)
+ASGI_APPLICATION = 'pogosmarketplace.asgi.application'
+
 
 # We are telling this 'settings.py' file that we are using a custom user model(instead of the default django admin user model) which we created in 'account' app model:
 AUTH_USER_MODEL = 'accounts.Account'
@@ -143,6 +148,45 @@ else:
     }
 
 
+#-------------------CACHE CONFIGURATION:--------------------------
+# The cache holds data that is read on every page but rarely changes (e.g the category menu).
+# In 'production' the cache lives in files shared by all gunicorn workers on the server, so a change made by one worker is seen by all of them.
+# In 'development' a local memory cache is enough.
+if ENVIRONMENT == "production":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_LOCATION", BASE_DIR / "cache"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "pogosmarketplace",
+        }
+    }
+
+
+#-------------------STORE LISTING:--------------------------
+# When True, the store pages link to each other with opaque cursors ('?cursor=...') instead of page numbers.
+# Every page then costs one indexed query however deep it is, which matters for big categories. The page numbers are not shown in that mode.
+STORE_CURSOR_PAGINATION = os.environ.get("STORE_CURSOR_PAGINATION", "False") == "True"
+
+
+#-------------------SESSIONS AND GUEST CARTS:--------------------------
+# Sessions are read from the cache and only go to the database on a cache miss or when they change.
+# Other choices: "django.contrib.sessions.backends.db" (database only), "django.contrib.sessions.backends.cache" (cache only, lost when the cache is cleared)
+# or "django.contrib.sessions.backends.signed_cookies" (no server storage at all, the data lives in the browser cookie).
+SESSION_ENGINE = os.environ.get("SESSION_ENGINE", "django.contrib.sessions.backends.cached_db")
+
+# How a guest's cart is found (see '_cart_id' in 'carts/views.py'):
+# - "session": by the session key, a session is created on the first add-to-cart.
+# - "cookie": by a random token in a signed cookie, set on the first add-to-cart. Guests never need a session.
+# In both modes, browsing without adding anything to the cart writes nothing to the database.
+CART_ID_MODE = os.environ.get("CART_ID_MODE", "session")
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -318,5 +362,10 @@ PAYPAL_SECRET = os.environ.get('PAYPAL_SECRET') # for sandbox
 PAYPAL_API_BASE = os.environ.get('PAYPAL_API_BASE')  # for sandbox
 PAYPAL_MODE = "sandbox"  # for sandbox. Change to "live" for production
 
+# Seconds to wait for PayPal to accept a connection / to answer, and how many times a failed call is retried (see 'orders/paypal.py')
+PAYPAL_CONNECT_TIMEOUT = float(os.environ.get('PAYPAL_CONNECT_TIMEOUT', 3.05))
+PAYPAL_READ_TIMEOUT = float(os.environ.get('PAYPAL_READ_TIMEOUT', 20))
+PAYPAL_MAX_RETRIES = int(os.environ.get('PAYPAL_MAX_RETRIES', 2))
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -5,24 +5,24 @@ document.addEventListener('DOMContentLoaded', function () {
 
     if (!typeSelect || !productSelect) return;
 
-    // Store all original product options
-    const allOptions = Array.from(productSelect.options);
+    // The product dropdown is an autocomplete: the products it offers are filtered by
+    // product_type on the server (see 'autocomplete_scope.js'), here we only keep the selection consistent
+    function selectedProductType() {
+        const selectedOption = productSelect.options[productSelect.selectedIndex];
+        const label = selectedOption?.textContent?.toLowerCase() || '';
+        if (label.includes('[variation]')) return 'variation';
+        if (label.includes('[combination]')) return 'combination';
+        return '';
+    }
 
     function filterProductsAndTogglePrice() {
         const selectedType = typeSelect.value;
 
-        // Filter the product dropdown
-        productSelect.innerHTML = '';
-
-        const filtered = allOptions.filter(option => {
-            if (!option.value) return true; // Keep placeholder
-            const label = option.textContent.toLowerCase();
-            return selectedType === '' ||
-                   (selectedType === 'variation' && label.includes('[variation]')) ||
-                   (selectedType === 'combination' && label.includes('[combination]'));
-        });
-
-        filtered.forEach(option => productSelect.appendChild(option.cloneNode(true)));
+        // Clear the product if it doesn't have the chosen type
+        const productType = selectedProductType();
+        if (selectedType && productType && productType !== selectedType) {
+            django.jQuery(productSelect).val(null).trigger('change');
+        }
 
         // Automatically hide price field if 'combination' is selected
         if (priceRow) {
@@ -34,12 +34,11 @@ document.addEventListener('DOMContentLoaded', function () {
     typeSelect.addEventListener('change', filterProductsAndTogglePrice);
 
     // Also listen when a product is selected — optional fallback
-    productSelect.addEventListener('change', () => {
-        const selectedOption = productSelect.options[productSelect.selectedIndex];
-        const label = selectedOption?.textContent?.toLowerCase();
-        const isCombination = label && label.includes('[combination]');
+    // (the autocomplete triggers jQuery events, which 'addEventListener' doesn't receive)
+    django.jQuery(productSelect).on('change', () => {
+        const isCombination = selectedProductType() === 'combination';
         if (priceRow) priceRow.style.display = isCombination ? 'none' : 'block';
     });
 
     filterProductsAndTogglePrice(); // Initial run
-});
\ No newline at end of file
+});
@@ -1,12 +1,24 @@
 from django.shortcuts import render
 from store.models import Product
+from store.page_cache import catalog_cache_version
+
+# The home page only shows this many products (the newest ones). The full catalog is on the store page.
+HOME_FEED_LIMIT = 8
 
 def home(request):
-    products = Product.objects.filter(is_available=True)
+    # The newest available products, with only the fields the product cards use ('get_url' reads the stored 'url_path').
+    # The queryset is lazy: it only runs when the cached feed in 'home.html' has to be rendered again.
+    products = (
+        Product.objects.filter(is_available=True)
+        .only('product_name', 'slug', 'price', 'images', 'url_path')
+        .order_by('-created_date', '-id')[:HOME_FEED_LIMIT]
+    )
 
     context = {
         'products': products,
+        # Part of the feed's cache key: it changes whenever a product or category changes (see 'store/page_cache.py')
+        'catalog_version': catalog_cache_version(),
     }
 
     # Render the home page template
-    return render(request, 'home.html', context)
\ No newline at end of file
+    return render(request, 'home.html', context)
@@ -0,0 +1,38 @@
+// Adds the current form's context to the admin autocomplete requests, so the server only
+// returns matching choices (see 'get_search_results' in store/admin/product_admin.py and variation_admin.py):
+// - the 'product' autocomplete gets the chosen product type ('product_type')
+// - the 'variations' autocomplete gets the combination's product ('product')
+'use strict';
+{
+    const $ = django.jQuery;
+
+    function currentProductId() {
+        // Combination form: the product chosen in the form
+        const productSelect = document.getElementById('id_product');
+        if (productSelect) return productSelect.value;
+        // Product change page (combinations inline): the product being edited
+        const match = window.location.pathname.match(/\/store\/product\/(\d+)\/change\//);
+        return match ? match[1] : '';
+    }
+
+    $.ajaxPrefilter(function (options) {
+        if (!options.url || options.url.indexOf('/autocomplete/') === -1) return;
+
+        const params = new URLSearchParams(options.data || '');
+        const field = params.get('field_name');
+
+        if (field === 'product') {
+            const typeSelect = document.getElementById('id_product_type');
+            if (typeSelect && typeSelect.value) params.set('product_type', typeSelect.value);
+        } else if (field === 'variations') {
+            const productId = currentProductId();
+            if (productId) params.set('product', productId);
+        }
+        options.data = params.toString();
+    });
+
+    // A new product means other variations: drop the ones chosen for the previous product
+    $(document).on('change', '#id_product', function () {
+        $('#id_variations').val(null).trigger('change');
+    });
+}
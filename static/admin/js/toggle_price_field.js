@@ -13,5 +13,5 @@ document.addEventListener('DOMContentLoaded', function () {
     };
 
     togglePriceVisibility(); // Run once on load
-    productSelect.addEventListener('change', togglePriceVisibility); // React to user input
+    django.jQuery(productSelect).on('change', togglePriceVisibility); // React to user input (the autocomplete triggers jQuery events)
 });
\ No newline at end of file
@@ -1,14 +1,19 @@
 from django.contrib import admin
-from django.db import models
-from itertools import product as cartesian_product
-from ..models import VariationCombination
+from django.db import transaction
+from ..combinations import generate_combinations
+from ..page_cache import invalidate_catalog, invalidate_product_pages
 
 @admin.action(description="Reset stock to zero")
 def reset_stock(modeladmin, request, queryset):
     """
     Admin action to reset the stock of selected products to zero.
     """
-    count = queryset.update(stock=0)
+    with transaction.atomic():
+        product_ids = list(queryset.values_list('pk', flat=True))
+        count = queryset.update(stock=0)
+        # update() skips the model signals: drop the cached pages once the reset commits
+        invalidate_product_pages(product_ids)
+        invalidate_catalog()
     modeladmin.message_user(
         request,
         f"✅ Stock reset to zero for {count} product(s)."
@@ -19,37 +24,16 @@ def bulk_create_combinations(modeladmin, request, queryset):
     """
     Admin action to generate all valid variation combinations based on
     variation categories for selected products.
+    Existing combinations are loaded once per product and the missing ones are
+    inserted in bulk (see 'store.combinations'). For very large products, the
+    'generate_combinations' management command does the same with progress output.
     """
     created_total = 0
 
     for product in queryset:
-        # Get distinct variation categories linked to the product
-        categories = product.variation_set.values_list('variation_category', flat=True).distinct()
-
-        if not categories:
-            continue  # Skip if no variation categories present
-
-        # Group variations by category
-        variation_groups = [
-            list(product.variation_set.filter(variation_category=cat))
-            for cat in categories
-        ]
-
-        # Cartesian product gives all possible combinations of variations
-        for combo in cartesian_product(*variation_groups):
-            # Check if this exact combination already exists
-            existing = VariationCombination.objects.filter(product=product)\
-                .filter(variations__in=combo)\
-                .annotate(num=models.Count('variations'))\
-                .filter(num=len(combo))
-
-            if not existing.exists():
-                # Create the new variation combination
-                new_combo = VariationCombination.objects.create(product=product, stock=0)
-                new_combo.variations.set(combo)
-                created_total += 1
+        created_total += generate_combinations(product)
 
     modeladmin.message_user(
         request,
         f"✅ Created {created_total} new variation combination(s)."
-    )
\ No newline at end of file
+    )
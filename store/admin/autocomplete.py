@@ -0,0 +1,10 @@
+def is_autocomplete_for(request, model_name, field_name):
+    """
+    True if 'request' is the admin autocomplete asking for the choices of
+    'store.<model_name>.<field_name>' (the admin passes these in the query string).
+    """
+    return (
+        request.GET.get('app_label') == 'store'
+        and request.GET.get('model_name') == model_name
+        and request.GET.get('field_name') == field_name
+    )
@@ -1,7 +1,7 @@
 from django import forms
 from django.core.exceptions import ValidationError
-from ..models import Product, Variation, VariationCombination
-from django.forms.widgets import Select
+from django.forms.models import BaseInlineFormSet, InlineForeignKeyField
+from ..models import Product, Variation, VariationCombination, make_variation_signature
 
 
 # ——————————————————————————————————————
@@ -30,35 +30,11 @@ class ProductForm(forms.ModelForm):
 # ——————————————————————————————————————
 # VariationForm
 # ——————————————————————————————————————
-class ProductTypeAwareSelect(Select):
-    def create_option(self, name, value, label, selected, index, subindex=None, attrs=None):
-        option = super().create_option(name, value, label, selected, index, subindex=subindex, attrs=attrs)
-        if value:
-            try:
-                product = Product.objects.get(id=value)
-                option['attrs']['data-product-type'] = product.product_type
-            except Product.DoesNotExist:
-                pass
-        return option
-
-
-class ProductTypeAwareSelect(Select):
-    """Custom select that adds data-product-type to each option (for JavaScript filtering)."""
-    def create_option(self, name, value, label, selected, index, subindex=None, attrs=None):
-        option = super().create_option(name, value, label, selected, index, subindex=subindex, attrs=attrs)
-        if value:
-            try:
-                product = Product.objects.only('product_type').get(id=value)
-                option['attrs']['data-product-type'] = product.product_type
-            except Product.DoesNotExist:
-                pass
-        return option
-
 class VariationForm(forms.ModelForm):
     """
     Admin form for Variation that:
     - Introduces 'product_type' dropdown for client-side filtering
-    - Populates 'product' dropdown with variation/combination products
+    - Limits the 'product' autocomplete to variation/combination products
     - Removes 'price' field server-side if product type is 'combination'
     """
     product_type = forms.ChoiceField(
@@ -78,21 +54,18 @@ class VariationForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        # Prefetch valid products
-        products = Product.objects.filter(
+        # Valid products. The 'product' widget is an autocomplete (see VariationAdmin.autocomplete_fields):
+        # it only renders the selected product and searches the others with the product type chosen above
+        self.fields['product'].queryset = Product.objects.filter(
             product_type__in=['variation', 'combination']
-        ).only('id', 'product_name', 'product_type')
-        self.fields['product'].queryset = products
-
-        # Replace 'product' field widget with enhanced select (for JS)
-        product_choices = [('', '---------')] + [
-            (p.id, f"{p.product_name} [{p.product_type}]") for p in products
-        ]
-        self.fields['product'].widget = ProductTypeAwareSelect(
-            choices=product_choices,
-            attrs={'id': 'id_product'}
         )
 
+        # When editing, preselect the type of the variation's product
+        instance = kwargs.get('instance')
+        product_type = instance.product.product_type if instance and instance.product_id else None
+        if product_type:
+            self.fields['product_type'].initial = product_type
+
         # Reorder fields: product_type appears before product
         reordered = {
             'product_type': self.fields.pop('product_type'),
@@ -102,9 +75,7 @@ class VariationForm(forms.ModelForm):
         self.fields = reordered
 
         # Remove price field if editing and product is 'combination'
-        instance = kwargs.get('instance')
-        product = instance.product if instance else None
-        if product and product.product_type == 'combination':
+        if product_type == 'combination':
             self.fields.pop('price', None)
 
     def clean(self):
@@ -155,6 +126,9 @@ class VariationCombinationForm(forms.ModelForm):
             product_type__in=['variation', 'combination']
         )
 
+        # Both fields are autocompletes (see VariationCombinationAdmin.autocomplete_fields): the variations
+        # offered are the ones of the selected product (see VariationAdmin.get_search_results)
+
         # Step 2: Ensure related variation widget allows "+" icon
         self.fields['variations'].widget.can_add_related = True
         self.fields['product'].widget.can_add_related = True
@@ -172,14 +146,46 @@ class VariationCombinationForm(forms.ModelForm):
             raise ValidationError("Please select a product and at least one variation.")
 
         # Step 4: Ensure all selected variations belong to the selected product
-        for v in variations:
-            if v.product != product:
-                raise ValidationError(f"The variation '{v}' does not belong to the selected product.")
-
-        # Step 5: Validate stock constraint against product's stock
-        if stock is not None and stock > product.stock:
+        # ('variations' is a queryset of the selected ids: one query checks all of them)
+        foreign_variation = variations.exclude(product_id=product.pk).first()
+        if foreign_variation is not None:
+            raise ValidationError(f"The variation '{foreign_variation}' does not belong to the selected product.")
+
+        # Step 5: Refuse a second combination with exactly the same variations (same signature)
+        signature = make_variation_signature(variations.values_list('pk', flat=True))
+        duplicates = VariationCombination.objects.filter(product=product, signature=signature)
+        if self.instance.pk:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise ValidationError("This product already has a combination with exactly these variations.")
+
+        # Step 6: Validate stock constraint against product's stock
+        # Skipped in the product page (VariationCombinationInline), where the product's stock is the total of the rows
+        # being edited. There the inline formset has replaced the product field with an 'InlineForeignKeyField'.
+        in_product_page = isinstance(self.fields['product'], InlineForeignKeyField)
+        if not in_product_page and stock is not None and stock > product.stock:
             raise ValidationError(f"Combination stock ({stock}) cannot exceed product stock ({product.stock}).")
 
         return cleaned_data
 
 
+class VariationCombinationInlineFormSet(BaseInlineFormSet):
+    """
+    The combinations of the product page: two rows can't be saved with exactly the same variations
+    (each row is also checked against the saved combinations, see VariationCombinationForm).
+    """
+    def clean(self):
+        super().clean()
+        seen = set()
+        for form in self.forms:
+            if not hasattr(form, 'cleaned_data') or self._should_delete_form(form):
+                continue
+            variations = form.cleaned_data.get('variations')
+            if not variations:
+                continue
+            signature = make_variation_signature(variation.pk for variation in variations)
+            if signature in seen:
+                raise ValidationError("Two combinations have exactly the same variations.")
+            seen.add(signature)
+
+
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from ..models import Variation, VariationCombination
+from .forms import VariationCombinationForm, VariationCombinationInlineFormSet
 
 class VariationInline(admin.TabularInline):
     """
@@ -11,8 +12,11 @@ class VariationInline(admin.TabularInline):
 class VariationCombinationInline(admin.TabularInline):
     """
     Inline form for managing grouped variation combinations inside the product admin.
-    Provides a multi-select interface for linking variations.
+    Variations are linked with an autocomplete, which only loads the product's variations as you search.
+    Rows are validated like in the combination admin (variations of this product, no duplicates).
     """
     model = VariationCombination
+    form = VariationCombinationForm
+    formset = VariationCombinationInlineFormSet
     extra = 1
-    filter_horizontal = ('variations',)  # Enable dual list for selecting related variations
\ No newline at end of file
+    autocomplete_fields = ('variations',)  # Searched as you type instead of listing every variation
\ No newline at end of file
@@ -3,6 +3,7 @@ from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 
 from .actions import reset_stock, bulk_create_combinations
+from .autocomplete import is_autocomplete_for
 from .filters import LowStockFilter
 from .forms import ProductForm
 from .inlines import VariationInline, VariationCombinationInline
@@ -16,9 +17,15 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ('is_available', LowStockFilter)
     actions = [reset_stock, bulk_create_combinations]
 
+    # Searched by the 'product' autocompletes of the variation and combination forms
+    search_fields = ('product_name',)
+
     # Optional external JS file (e.g. for toggle logic)
     class Media:
-        js = ('admin/js/product_type_toggle.js',)
+        js = (
+            'admin/js/product_type_toggle.js',
+            'admin/js/autocomplete_scope.js',  # scopes the inline 'variations' autocomplete to this product
+        )
 
     # Fields displayed in list view
     def get_list_display(self, request):
@@ -47,6 +54,22 @@ class ProductAdmin(admin.ModelAdmin):
         """Improve performance with prefetching."""
         return super().get_queryset(request).prefetch_related('variation_set', 'variation_combinations')
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        The 'product' autocompletes of variations and combinations only offer products with
+        variations or combinations, narrowed to the type chosen in the form ('product_type').
+        """
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if is_autocomplete_for(request, 'variation', 'product') or is_autocomplete_for(request, 'variationcombination', 'product'):
+            product_type = request.GET.get('product_type')
+            if product_type in ('variation', 'combination'):
+                queryset = queryset.filter(product_type=product_type)
+            else:
+                queryset = queryset.filter(product_type__in=['variation', 'combination'])
+            # The autocomplete is paginated: give the pages a stable order
+            queryset = queryset.order_by('product_name', 'id')
+        return queryset, may_have_duplicates
+
     def get_form(self, request, obj=None, **kwargs):
         """Dynamically remove price from form based on product_type."""
         form = super().get_form(request, obj, **kwargs)
@@ -25,17 +25,25 @@ class ProductTypeFilter(admin.SimpleListFilter):
 
 from django.contrib import admin
 from .forms import VariationForm
+from .autocomplete import is_autocomplete_for
 from .filters import ProductTypeFilter
 from ..models import Variation
 
 class VariationAdmin(admin.ModelAdmin):
     """
     Admin configuration for managing individual product variations.
-    Includes dynamic filtering, smart field layout, and stock recalculation.
+    Includes dynamic filtering and smart field layout.
+    The parent product's stock is recalculated by the model signals (see 'store.inventory').
     """
 
     form = VariationForm
 
+    # 'product' is searched as you type instead of listing every product in the page
+    autocomplete_fields = ('product',)
+
+    # Used by the 'variations' autocomplete of the combinations (the product name is also searched)
+    search_fields = ('variation_category', 'variation_value', 'product__product_name')
+
     # Fields displayed in the admin changelist view
     list_display = (
         'product',
@@ -70,21 +78,20 @@ class VariationAdmin(admin.ModelAdmin):
         }),
     )
 
-    def save_model(self, request, obj, form, change):
-        """
-        After saving, recalculate and update the parent product’s total stock.
-        """
-        super().save_model(request, obj, form, change)
-        obj.product.stock = sum(v.stock or 0 for v in obj.product.variation_set.all())
-        obj.product.save(update_fields=['stock'])
-
-    def delete_model(self, request, obj):
+    def get_search_results(self, request, queryset, search_term):
         """
-        After deletion, recalculate and update the parent product’s stock.
+        When the 'variations' autocomplete of a combination asks for variations, only offer
+        variations of combination products, and of the combination's product once it is known.
         """
-        super().delete_model(request, obj)
-        obj.product.stock = sum(v.stock or 0 for v in obj.product.variation_set.all())
-        obj.product.save(update_fields=['stock'])
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if is_autocomplete_for(request, 'variationcombination', 'variations'):
+            queryset = queryset.filter(product__product_type='combination')
+            product_id = request.GET.get('product')
+            if product_id and product_id.isdigit():
+                queryset = queryset.filter(product_id=product_id)
+            # The autocomplete is paginated: give the pages a stable order
+            queryset = queryset.order_by('variation_category', 'variation_value', 'id')
+        return queryset, may_have_duplicates
 
     class Media:
         # Load the JS that handles:
@@ -93,6 +100,7 @@ class VariationAdmin(admin.ModelAdmin):
         js = (
             'admin/js/product_type_filter_live.js',
             'admin/js/toggle_price_field.js',
+            'admin/js/autocomplete_scope.js',
         )
 
 
@@ -8,6 +8,13 @@ class VariationCombinationAdmin(admin.ModelAdmin):
     # Use the custom form with validation logic
     form = VariationCombinationForm
 
+    # Searched as you type instead of listing every product / variation in the page
+    autocomplete_fields = ('product', 'variations')
+
+    class Media:
+        # Sends the chosen product with the 'variations' autocomplete requests
+        js = ('admin/js/autocomplete_scope.js',)
+
     # Define fields visible in the list view
     list_display = (
         'product',
@@ -32,23 +39,3 @@ class VariationCombinationAdmin(admin.ModelAdmin):
         return ", ".join(f"{v.variation_category}:{v.variation_value}" for v in obj.variations.all())
 
     get_variations.short_description = 'Variations'
-
-    def save_model(self, request, obj, form, change):
-        """
-        After saving a variation combination, recalculate the parent product’s stock.
-        """
-        super().save_model(request, obj, form, change)
-        obj.product.stock = sum(
-            combo.stock or 0 for combo in obj.product.variation_combinations.all()
-        )
-        obj.product.save(update_fields=['stock'])
-
-    def delete_model(self, request, obj):
-        """
-        After deleting a combination, recalculate the parent product’s stock.
-        """
-        super().delete_model(request, obj)
-        obj.product.stock = sum(
-            combo.stock or 0 for combo in obj.product.variation_combinations.all()
-        )
-        obj.product.save(update_fields=['stock'])
\ No newline at end of file
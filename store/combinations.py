@@ -0,0 +1,63 @@
+from itertools import product as cartesian_product, islice
+
+from django.db import transaction
+
+from .models import Variation, VariationCombination, make_variation_signature
+from .page_cache import invalidate_product_pages
+
+
+def variation_groups(product):
+    """
+    Return the product's variation ids grouped by variation category, in one query.
+    """
+    groups = {}
+    rows = Variation.objects.filter(product=product).order_by('variation_category', 'id').values_list('variation_category', 'id')
+    for category, pk in rows:
+        groups.setdefault(category, []).append(pk)
+    return list(groups.values())
+
+
+def missing_combinations(product):
+    """
+    Yield the variation id tuples of every combination (one variation per category)
+    that the product does not have yet. Existing combinations are loaded once, by signature.
+    """
+    groups = variation_groups(product)
+    if not groups:
+        return
+    existing = set(VariationCombination.objects.filter(product=product).values_list('signature', flat=True))
+    for combo in cartesian_product(*groups):
+        if make_variation_signature(combo) not in existing:
+            yield combo
+
+
+def generate_combinations(product, batch_size=500, progress=None):
+    """
+    Create every missing variation combination of a product with 'bulk_create',
+    'batch_size' combinations (and their variation links) per transaction.
+    'progress', if given, is called as progress(product, created_so_far) after each batch.
+    Returns the number of combinations created.
+    """
+    Link = VariationCombination.variations.through
+    candidates = missing_combinations(product)
+    created = 0
+    while True:
+        batch = list(islice(candidates, batch_size))
+        if not batch:
+            break
+        with transaction.atomic():
+            combinations = VariationCombination.objects.bulk_create([
+                VariationCombination(product=product, stock=0, signature=make_variation_signature(combo))
+                for combo in batch
+            ])
+            Link.objects.bulk_create([
+                Link(variationcombination_id=combination.pk, variation_id=variation_id)
+                for combination, combo in zip(combinations, batch)
+                for variation_id in combo
+            ])
+            # bulk_create skips the model signals: drop the cached product page when the batch commits
+            invalidate_product_pages([product.pk])
+        created += len(batch)
+        if progress:
+            progress(product, created)
+    return created
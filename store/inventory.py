@@ -0,0 +1,240 @@
+import logging
+import threading
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Product, Variation, VariationCombination, make_variation_signature
+from .page_cache import invalidate_product_pages
+
+
+logger = logging.getLogger(__name__)
+
+
+# One line of an order as far as stock is concerned.
+# A line without variations takes stock from the product itself, a line with one variation from that variation,
+# and a line with several variations from the matching variation combination.
+StockLine = namedtuple('StockLine', ['product_id', 'variation_ids', 'quantity'])
+
+
+def stock_lines(items):
+    """
+    Build StockLines from a queryset of CartItem or OrderProduct rows, in two queries.
+    """
+    rows = list(items.values_list('pk', 'product_id', 'quantity'))
+    through = items.model.variations.through
+    owner_field = f'{items.model._meta.model_name}_id'
+    variation_ids = {pk: [] for pk, _, _ in rows}
+    links = through.objects.filter(**{f'{owner_field}__in': variation_ids}).values_list(owner_field, 'variation_id')
+    for owner_id, variation_id in links:
+        variation_ids[owner_id].append(variation_id)
+    return [
+        StockLine(product_id, tuple(sorted(variation_ids[pk])), quantity)
+        for pk, product_id, quantity in rows
+    ]
+
+
+def _decrement(model, quantities):
+    """
+    Subtract {pk: quantity} from 'model.stock' in a single UPDATE.
+    """
+    if not quantities:
+        return
+    model.objects.filter(pk__in=quantities).update(stock=Case(
+        *[When(pk=pk, then=F('stock') - Value(quantity)) for pk, quantity in quantities.items()],
+        default=F('stock'),
+        output_field=model._meta.get_field('stock'),
+    ))
+
+
+def recompute_product_stock(product_ids):
+    """
+    Set the stock of variation and combination products to the total of their active
+    variations / combinations. Simple products keep their own stock.
+    Runs one UPDATE per product type, whatever the number of products.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+
+    variation_total = (
+        Variation.objects.filter(product=OuterRef('pk'), is_active=True, stock__isnull=False)
+        .values('product')
+        .annotate(total=Sum('stock'))
+        .values('total')
+    )
+    Product.objects.filter(pk__in=product_ids, product_type='variation').update(
+        stock=Coalesce(Subquery(variation_total), 0)
+    )
+
+    combination_total = (
+        VariationCombination.objects.filter(product=OuterRef('pk'), is_active=True)
+        .values('product')
+        .annotate(total=Sum('stock'))
+        .values('total')
+    )
+    Product.objects.filter(pk__in=product_ids, product_type='combination').update(
+        stock=Coalesce(Subquery(combination_total), 0)
+    )
+
+    # These UPDATEs skip the model signals, so drop the cached product pages here
+    invalidate_product_pages(product_ids)
+
+
+# Products whose stock must be recomputed, collected per thread.
+_rollups = threading.local()
+
+
+class _PendingRollup:
+    """
+    'on_commit' callback recomputing the stock of every product marked during a transaction.
+    It is registered once per marked change; the first call does the work and the others find
+    nothing left to do.
+    """
+    def __init__(self):
+        self.product_ids = set()
+
+    def __call__(self):
+        if getattr(_rollups, 'pending', None) is self:
+            _rollups.pending = None
+        product_ids, self.product_ids = self.product_ids, set()
+        if product_ids:
+            recompute_product_stock(product_ids)
+
+
+def schedule_stock_rollup(product_id):
+    """
+    Mark a product whose variations / combinations changed.
+
+    Inside a transaction, the product's stock is recomputed once when it commits, together
+    with every other product marked in that transaction. Outside a transaction it is
+    recomputed straight away.
+    """
+    suspended = getattr(_rollups, 'suspended', None)
+    if suspended is not None:
+        suspended.add(product_id)
+        return
+
+    rollup = getattr(_rollups, 'pending', None)
+    if rollup is None:
+        rollup = _rollups.pending = _PendingRollup()
+    rollup.product_ids.add(product_id)
+    # Registered on every call: a rolled back savepoint drops the callbacks registered inside it, so this
+    # way the latest change always has one queued. (Products marked in the rolled back part are
+    # recomputed too, which is harmless: the totals are read from the database.)
+    transaction.on_commit(rollup)
+
+
+@contextmanager
+def suspend_stock_rollups():
+    """
+    Collect stock rollups while importing many variations / combinations, then recompute
+    each affected product once on exit:
+
+        with suspend_stock_rollups():
+            for row in rows:
+                VariationCombination.objects.create(...)
+    """
+    if getattr(_rollups, 'suspended', None) is not None:
+        # Nested use: the outermost block flushes
+        yield
+        return
+
+    _rollups.suspended = set()
+    try:
+        yield
+    finally:
+        product_ids, _rollups.suspended = _rollups.suspended, None
+        for product_id in product_ids:
+            schedule_stock_rollup(product_id)
+
+
+def deduct_stock(lines):
+    """
+    Take the stock of an order's lines in one transaction.
+
+    The product, variation and combination rows involved are locked ('select_for_update')
+    so concurrent checkouts of the same item are serialised, every line is checked against
+    the locked stock, and the decrements are written with one UPDATE per table. Parent
+    product totals are then recomputed with one aggregate UPDATE per product type.
+
+    Lines without enough stock (or without a matching combination) are left untouched and
+    returned, so the caller can report them.
+    """
+    lines = [line for line in lines if line.quantity > 0]
+    simple, single, combined = [], [], []
+    for line in lines:
+        if not line.variation_ids:
+            simple.append(line)
+        elif len(line.variation_ids) == 1:
+            single.append(line)
+        else:
+            combined.append(line)
+
+    with transaction.atomic():
+        # Lock rows in primary key order so two orders for the same items can't deadlock
+        product_stock = dict(
+            Product.objects.select_for_update()
+            .filter(pk__in={line.product_id for line in simple})
+            .order_by('pk')
+            .values_list('pk', 'stock')
+        )
+        variation_stock = dict(
+            Variation.objects.select_for_update()
+            .filter(pk__in={line.variation_ids[0] for line in single})
+            .order_by('pk')
+            .values_list('pk', 'stock')
+        )
+        combination_filter = Q(pk__in=[])
+        for line in combined:
+            combination_filter |= Q(product_id=line.product_id, signature=make_variation_signature(line.variation_ids))
+        combinations = {}
+        for pk, product_id, signature, stock in (
+            VariationCombination.objects.select_for_update()
+            .filter(combination_filter)
+            .order_by('pk')
+            .values_list('pk', 'product_id', 'signature', 'stock')
+        ):
+            # If the same combination was saved twice, keep the first one
+            combinations.setdefault((product_id, signature), (pk, stock))
+
+        rejected = []
+        rollup_products = set()
+        product_take, variation_take, combination_take = Counter(), Counter(), Counter()
+
+        for line in simple:
+            if product_stock.get(line.product_id, 0) - product_take[line.product_id] >= line.quantity:
+                product_take[line.product_id] += line.quantity
+            else:
+                rejected.append(line)
+
+        for line in single:
+            pk = line.variation_ids[0]
+            if (variation_stock.get(pk) or 0) - variation_take[pk] >= line.quantity:
+                variation_take[pk] += line.quantity
+                rollup_products.add(line.product_id)
+            else:
+                rejected.append(line)
+
+        for line in combined:
+            pk, stock = combinations.get((line.product_id, make_variation_signature(line.variation_ids)), (None, 0))
+            if pk is not None and stock - combination_take[pk] >= line.quantity:
+                combination_take[pk] += line.quantity
+                rollup_products.add(line.product_id)
+            else:
+                rejected.append(line)
+
+        _decrement(Product, product_take)
+        _decrement(Variation, variation_take)
+        _decrement(VariationCombination, combination_take)
+        invalidate_product_pages(product_take)
+
+        recompute_product_stock(rollup_products)
+
+    for line in rejected:
+        logger.warning("Not enough stock for product %s (variations %s, quantity %s)",
+                       line.product_id, line.variation_ids, line.quantity)
+    return rejected
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.combinations import generate_combinations
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = "Create every missing variation combination of the given products, reporting progress."
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', nargs='+', type=int)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        products = Product.objects.filter(pk__in=options['product_ids'])
+        if not products:
+            raise CommandError("No matching products.")
+
+        def progress(product, created):
+            self.stdout.write(f"{product.product_name}: {created} combination(s) created...")
+
+        total = 0
+        for product in products:
+            total += generate_combinations(product, batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Created {total} new variation combination(s)."))
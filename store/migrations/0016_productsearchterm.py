@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import re
+from collections import Counter
+
+
+# A copy of the indexing rules of 'store.search' as they were when this migration was written.
+# Migrations must not import app code: later changes to it would change (or break) what this migration does.
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 50
+NAME_WEIGHT = 5
+DESCRIPTION_WEIGHT = 1
+WORD_RE = re.compile(r'\w+')
+BATCH_SIZE = 1000
+
+
+def tokenize(text):
+    return [
+        word[:MAX_TERM_LENGTH]
+        for word in WORD_RE.findall((text or '').lower())
+        if len(word) >= MIN_TERM_LENGTH
+    ]
+
+
+def build_terms(product_name, description):
+    weights = Counter()
+    for term in tokenize(product_name):
+        weights[term] += NAME_WEIGHT
+    for term in tokenize(description):
+        weights[term] += DESCRIPTION_WEIGHT
+    return weights
+
+
+def build_search_index(apps, schema_editor):
+    # Products are streamed and the rows written every BATCH_SIZE, so memory use doesn't grow with the catalog
+    Product = apps.get_model('store', 'Product')
+    ProductSearchTerm = apps.get_model('store', 'ProductSearchTerm')
+    rows = []
+    products = Product.objects.order_by('id').values_list('id', 'product_name', 'description')
+    for product_id, product_name, description in products.iterator(chunk_size=BATCH_SIZE):
+        rows.extend(
+            ProductSearchTerm(term=term, product_id=product_id, weight=weight)
+            for term, weight in build_terms(product_name, description).items()
+        )
+        if len(rows) >= BATCH_SIZE:
+            ProductSearchTerm.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+            rows = []
+    ProductSearchTerm.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_alter_variation_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term'], name='store_search_term_idx', opclasses=['varchar_pattern_ops'])],
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:18
+
+from django.db import migrations, models
+
+
+def backfill_signatures(apps, schema_editor):
+    VariationCombination = apps.get_model('store', 'VariationCombination')
+    variation_ids = {}
+    for owner_id, variation_id in VariationCombination.variations.through.objects.values_list('variationcombination_id', 'variation_id'):
+        variation_ids.setdefault(owner_id, []).append(variation_id)
+    VariationCombination.objects.bulk_update(
+        [VariationCombination(pk=pk, signature='-'.join(str(v) for v in sorted(set(ids)))) for pk, ids in variation_ids.items()],
+        ['signature'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_productsearchterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='variationcombination',
+            name='signature',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='variationcombination',
+            index=models.Index(fields=['product', 'signature'], name='store_combination_sig_idx'),
+        ),
+        migrations.RunPython(backfill_signatures, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:25
+
+from django.db import migrations, models
+
+# Frozen copy of the 'product_detail' URL when this migration was written ('store.models.product_url_path'),
+# so the migration still gives the same paths if the URLs change later
+URL_PATH_FORMAT = '/store/category/{category_slug}/{product_slug}'
+BATCH_SIZE = 1000
+
+
+def backfill_url_paths(apps, schema_editor):
+    # Products are streamed and written every BATCH_SIZE, so memory use doesn't grow with the catalog
+    Product = apps.get_model('store', 'Product')
+    rows = Product.objects.values_list('id', 'slug', 'category__slug').order_by('id')
+    batch = []
+    for product_id, product_slug, category_slug in rows.iterator(chunk_size=BATCH_SIZE):
+        url_path = URL_PATH_FORMAT.format(category_slug=category_slug, product_slug=product_slug)
+        batch.append(Product(id=product_id, url_path=url_path))
+        if len(batch) >= BATCH_SIZE:
+            Product.objects.bulk_update(batch, ['url_path'])
+            batch = []
+    Product.objects.bulk_update(batch, ['url_path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='url_path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=400),
+        ),
+        migrations.RunPython(backfill_url_paths, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,85 @@
 from django.db import models
 from category.models import Category
 from django.urls import reverse
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+
+
+def make_variation_signature(variation_ids):
+    """
+    Canonical key for a set of variations: the sorted, de-duplicated ids joined by '-',
+    e.g. [7, 3, 7] -> '3-7'. No variations gives ''.
+    Stored on combinations and cart items so that "which row has exactly these variations"
+    is a single indexed lookup instead of comparing variation lists row by row.
+    """
+    return '-'.join(str(pk) for pk in sorted({int(pk) for pk in variation_ids}))
+
+
+def update_variation_signatures(model, field_name, instance, action, reverse, pk_set):
+    """
+    Keep 'field_name' of 'model' in step with its 'variations' many-to-many field.
+    Called from the 'm2m_changed' receivers of each model that stores a signature.
+    """
+    if reverse and action == 'pre_clear':
+        # 'instance' is a Variation: remember which rows lose it, 'post_clear' has no pk_set
+        remember_signature_owners(model, instance)
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        owner_ids = [instance.pk]
+    elif action == 'post_clear':
+        owner_ids = pop_signature_owners(model, instance)
+    else:
+        owner_ids = list(pk_set or [])
+    recompute_variation_signatures(model, field_name, owner_ids)
+
+
+def remember_signature_owners(model, variation):
+    """
+    Store on 'variation' the ids of the 'model' rows linked to it, before its links go away
+    without an 'm2m_changed' signal with their ids ('clear()' or deleting the variation).
+    """
+    owner_ids = list(model.objects.filter(variations=variation).values_list('pk', flat=True))
+    setattr(variation, f'_{model._meta.model_name}_signature_owner_ids', owner_ids)
+
+
+def pop_signature_owners(model, variation):
+    return variation.__dict__.pop(f'_{model._meta.model_name}_signature_owner_ids', [])
+
+
+def recompute_variation_signatures(model, field_name, owner_ids):
+    """
+    Recompute 'field_name' of the 'model' rows 'owner_ids' from their current variations.
+    """
+    if not owner_ids:
+        return
+    through = model.variations.through
+    owner_field = f'{model._meta.model_name}_id'
+    variation_ids = {pk: [] for pk in owner_ids}
+    rows = through.objects.filter(**{f'{owner_field}__in': owner_ids}).values_list(owner_field, 'variation_id')
+    for owner_id, variation_id in rows:
+        variation_ids[owner_id].append(variation_id)
+
+    model.objects.bulk_update(
+        [model(pk=pk, **{field_name: make_variation_signature(ids)}) for pk, ids in variation_ids.items()],
+        [field_name],
+    )
+
+
+def product_url_path(category_slug, product_slug):
+    return reverse('product_detail', args=[category_slug, product_slug])
+
+
+def product_url_prefix(category_slug):
+    """
+    The part of 'product_url_path' before the product slug, for every product of a category.
+    """
+    placeholder = 'product-slug'
+    return product_url_path(category_slug, placeholder)[:-len(placeholder)]
 
 
 class Product(models.Model):
@@ -29,13 +106,55 @@ class Product(models.Model):
     created_date = models.DateTimeField(auto_now_add=True)
     modified_date = models.DateTimeField(auto_now=True)
 
+    # The product page path ('/store/category/<category slug>/<product slug>'), stored so listings can link to products
+    # without loading each product's category or resolving the URL. Kept up to date by 'save' and by the
+    # 'update_product_url_paths' receiver when a category slug changes.
+    url_path = models.CharField(max_length=400, blank=True, default='', editable=False, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Back the store listing, which filters on category / availability and pages through products by id
+            models.Index(fields=['category', 'is_available', 'id'], name='store_product_listing_idx'),
+            models.Index(fields=['is_available', 'id'], name='store_product_available_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'slug', 'category'} & set(update_fields):
+            self.url_path = product_url_path(self.category.slug, self.slug)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'url_path'}
+        super().save(*args, **kwargs)
+
     def get_url(self):
-        return reverse('product_detail', args=[self.category.slug, self.slug])
+        # Products saved before 'url_path' existed fall back to resolving the URL
+        return self.url_path or product_url_path(self.category.slug, self.slug)
 
     def __str__(self):
         return f"{self.product_name} [{self.product_type}]"
 
 
+class ProductSearchTerm(models.Model):
+    """
+    One row of the product search index: a normalised word taken from a
+    product's name or description, with a weight used for ranking.
+    Rows are rebuilt by 'store.search.index_product' whenever a product is saved.
+    """
+    term = models.CharField(max_length=50)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # 'varchar_pattern_ops' lets PostgreSQL use the index for prefix (LIKE 'abc%') lookups.
+            # Other databases ignore opclasses.
+            models.Index(fields=['term'], name='store_search_term_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
+
+
 class Variation(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     variation_category = models.CharField(max_length=100)
@@ -48,26 +167,24 @@ class Variation(models.Model):
     def __str__(self):
         return f"{self.variation_category}: {self.variation_value}"
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if self.product.product_type == 'variation':
-            total_stock = Variation.objects.filter(
-                product=self.product,
-                is_active=True,
-                stock__isnull=False
-            ).aggregate(total=models.Sum('stock'))['total'] or 0
-            self.product.stock = total_stock
-            self.product.save(update_fields=['stock'])
-
 
 class VariationCombination(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="variation_combinations")
     variations = models.ManyToManyField(Variation)
+
+    # Sorted ids of 'variations' (see 'make_variation_signature'), maintained by the 'm2m_changed' receiver below
+    signature = models.CharField(max_length=255, blank=True, default='', editable=False)
+
     stock = models.PositiveIntegerField(default=0)
     price = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
     is_active = models.BooleanField(default=True)
     created_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'signature'], name='store_combination_sig_idx'),
+        ]
+
     def __str__(self):
         variations_text = ", ".join(
             f"{v.variation_category}:{v.variation_value}" for v in self.variations.all()
@@ -81,27 +198,75 @@ class VariationCombination(models.Model):
             return True
         return False
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        total = VariationCombination.objects.filter(
-            product=self.product,
-            is_active=True
-        ).aggregate(total=models.Sum('stock'))['total'] or 0
-        self.product.stock = total
-        self.product.save(update_fields=['stock'])
-
 
 class VariationManager(models.Manager):
     def by_category(self, category_name):
         return self.filter(variation_category=category_name, is_active=True)
 
 
+@receiver(m2m_changed, sender=VariationCombination.variations.through)
+def update_combination_signature(sender, instance, action, reverse, pk_set, **kwargs):
+    update_variation_signatures(VariationCombination, 'signature', instance, action, reverse, pk_set)
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        from .page_cache import invalidate_product_pages
+        invalidate_product_pages([instance.product_id])
+
+
+# Deleting a variation removes its many-to-many rows without an 'm2m_changed' signal, so the combinations
+# that had it are found before the delete and their signatures recomputed after it.
+@receiver(pre_delete, sender=Variation)
+def remember_combinations_of_variation(sender, instance, **kwargs):
+    remember_signature_owners(VariationCombination, instance)
+
+
+@receiver(post_delete, sender=Variation)
+def update_combination_signatures_after_delete(sender, instance, **kwargs):
+    recompute_variation_signatures(VariationCombination, 'signature', pop_signature_owners(VariationCombination, instance))
+
+
+# The parent product's stock is the total of its variations / combinations.
+# Instead of recomputing it on every save, the product is marked and recomputed once when the
+# transaction commits (see 'store.inventory.schedule_stock_rollup'), so saving 50 inline rows
+# costs one rollup instead of 50.
+@receiver([post_save, post_delete], sender=Variation)
 @receiver([post_save, post_delete], sender=VariationCombination)
-def update_product_stock_from_combinations(sender, instance, **kwargs):
-    product = instance.product
-    total_stock = VariationCombination.objects.filter(
-        product=product,
-        is_active=True
-    ).aggregate(total=models.Sum('stock'))['total'] or 0
-    product.stock = total_stock
-    product.save(update_fields=['stock'])
\ No newline at end of file
+def update_product_stock(sender, instance, **kwargs):
+    from .inventory import schedule_stock_rollup
+    schedule_stock_rollup(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, update_fields=None, **kwargs):
+    # Stock-only saves don't change the searchable text.
+    if update_fields and not {'product_name', 'description'} & set(update_fields):
+        return
+    from .search import index_product
+    index_product(instance)
+
+
+
+# The cached parts of the product page (see 'store.page_cache') are dropped whenever the product changes.
+# Variation and combination changes drop them through the stock rollup above ('recompute_product_stock').
+# Cached product listings (the home page feed) are dropped too.
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_page(sender, instance, **kwargs):
+    from .page_cache import invalidate_product_pages, invalidate_catalog
+    invalidate_product_pages([instance.pk])
+    invalidate_catalog()
+
+
+# A product's stored 'url_path' contains its category slug: when the slug changes, rewrite the paths of
+# all the category's products in one UPDATE (products already using the new slug are skipped).
+@receiver(post_save, sender=Category)
+def update_product_url_paths(sender, instance, **kwargs):
+    prefix = product_url_prefix(instance.slug)
+    Product.objects.filter(category=instance).exclude(url_path__startswith=prefix).update(
+        url_path=Concat(Value(prefix), F('slug'))
+    )
+
+
+# Product URLs contain the category slug, so a category change also drops the cached listings
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_catalog_for_category(sender, instance, **kwargs):
+    from .page_cache import invalidate_catalog
+    invalidate_catalog()
@@ -0,0 +1,78 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .variation_matrix import build_variation_matrix
+
+
+# Every product has a version stamp in the cache. It is replaced whenever the product, one of its
+# variations or combinations, or its stock changes, and is part of the key of everything cached for
+# the product page, so a change makes the old entries unreachable.
+PRODUCT_VERSION_KEY = 'product_version:{product_id}'
+VARIATION_MATRIX_KEY = 'variation_matrix:{product_id}:{version}'
+PRODUCT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# The same idea for pages listing many products (e.g. the home page feed): one stamp for the whole
+# catalog, replaced whenever any product or category changes.
+CATALOG_VERSION_KEY = 'catalog_version'
+
+
+def _cache_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def product_cache_version(product_id):
+    return _cache_version(PRODUCT_VERSION_KEY.format(product_id=product_id))
+
+
+def catalog_cache_version():
+    return _cache_version(CATALOG_VERSION_KEY)
+
+
+def bump_product_cache_versions(product_ids):
+    """
+    Invalidate everything cached for these products' pages.
+    """
+    version = time.time_ns()
+    cache.set_many(
+        {PRODUCT_VERSION_KEY.format(product_id=product_id): version for product_id in product_ids},
+        timeout=None,
+    )
+
+
+def invalidate_product_pages(product_ids):
+    """
+    Bump the products' versions once the current transaction commits (right away outside a
+    transaction), so a page rendered in the meantime can't be cached under the new version
+    with the old data.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    transaction.on_commit(lambda: bump_product_cache_versions(product_ids))
+
+
+def invalidate_catalog():
+    """
+    Drop the cached product listings once the current transaction commits.
+    """
+    transaction.on_commit(lambda: cache.set(CATALOG_VERSION_KEY, time.time_ns(), timeout=None))
+
+
+def get_variation_matrix(product, version=None):
+    """
+    'build_variation_matrix', cached until the product changes.
+    """
+    if version is None:
+        version = product_cache_version(product.pk)
+    key = VARIATION_MATRIX_KEY.format(product_id=product.pk, version=version)
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = build_variation_matrix(product)
+        cache.set(key, matrix, PRODUCT_CACHE_TIMEOUT)
+    return matrix
@@ -0,0 +1,118 @@
+import base64
+import binascii
+
+from django.core.cache import cache
+
+
+# Cached listing totals are allowed to lag behind the catalog by this long.
+COUNT_CACHE_TIMEOUT = 60 * 5
+
+
+def encode_cursor(direction, pk):
+    """
+    Turn a page boundary into an opaque string for the URL, e.g. ('next', 42) -> 'bjo0Mg'.
+    """
+    raw = f"{direction[0]}:{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Return (direction, pk) from 'encode_cursor', or ('next', None) (the first page)
+    for a missing or tampered cursor.
+    """
+    if not cursor:
+        return 'next', None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        direction, pk = raw.split(':', 1)
+        return {'n': 'next', 'p': 'previous'}[direction], int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError):
+        return 'next', None
+
+
+class CursorPage:
+    """
+    One page of a cursor-paginated listing.
+
+    Behaves like a Django 'Page' where the templates use it (iteration, 'has_next',
+    'has_previous', 'has_other_pages'), but links to its neighbours with 'next_cursor' /
+    'previous_cursor' instead of page numbers.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, has_previous, has_next):
+        self.object_list = object_list
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor('previous', self.object_list[0].pk)
+        return None
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor('next', self.object_list[-1].pk)
+        return None
+
+
+def paginate_by_cursor(queryset, cursor, per_page):
+    """
+    Return the CursorPage of 'queryset' (ordered by primary key) after / before 'cursor'.
+
+    Each page is one indexed range query (WHERE id > x ORDER BY id LIMIT n + 1), so
+    deep pages cost the same as the first one: there is no COUNT(*) and no OFFSET scan.
+    The extra row only tells whether there is a page after this one.
+    """
+    direction, pk = decode_cursor(cursor)
+
+    if direction == 'previous':
+        rows = list(queryset.filter(pk__lt=pk).order_by('-pk')[:per_page + 1])
+        if rows:
+            return CursorPage(rows[:per_page][::-1], has_previous=len(rows) > per_page, has_next=True)
+        # Everything before the cursor is gone: show the first page instead
+        pk = None
+
+    if pk is not None:
+        rows = list(queryset.filter(pk__gt=pk).order_by('pk')[:per_page + 1])
+        if rows:
+            return CursorPage(rows[:per_page], has_previous=True, has_next=len(rows) > per_page)
+        # Nothing after the cursor (the last products are gone, or the cursor was edited): show the last page instead
+        rows = list(queryset.order_by('-pk')[:per_page + 1])
+        return CursorPage(rows[:per_page][::-1], has_previous=len(rows) > per_page, has_next=False)
+
+    rows = list(queryset.order_by('pk')[:per_page + 1])
+    return CursorPage(rows[:per_page], has_previous=False, has_next=len(rows) > per_page)
+
+
+def cached_count(queryset, key, timeout=COUNT_CACHE_TIMEOUT):
+    """
+    'queryset.count()', cached under 'key' for a few minutes. Good enough for an
+    "N items found" label, which doesn't need to be exact to the second.
+    """
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
@@ -0,0 +1,116 @@
+import re
+from collections import Counter
+
+from django.db.models import Case, Max, Q, Sum, Value, When
+
+from .models import Product, ProductSearchTerm
+
+
+# Words shorter than this are not indexed and are ignored in search keywords.
+MIN_TERM_LENGTH = 2
+
+# Must match 'ProductSearchTerm.term' max_length.
+MAX_TERM_LENGTH = 50
+
+# A word in the product name counts for more than the same word in the description.
+NAME_WEIGHT = 5
+DESCRIPTION_WEIGHT = 1
+
+WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """
+    Split text into lowercase index terms.
+    """
+    return [
+        word[:MAX_TERM_LENGTH]
+        for word in WORD_RE.findall((text or '').lower())
+        if len(word) >= MIN_TERM_LENGTH
+    ]
+
+
+def build_terms(product):
+    """
+    Return a {term: weight} mapping for a product's name and description.
+    """
+    weights = Counter()
+    for term in tokenize(product.product_name):
+        weights[term] += NAME_WEIGHT
+    for term in tokenize(product.description):
+        weights[term] += DESCRIPTION_WEIGHT
+    return weights
+
+
+def index_product(product):
+    """
+    Replace the search index rows of a single product.
+    """
+    ProductSearchTerm.objects.filter(product=product).delete()
+    ProductSearchTerm.objects.bulk_create([
+        ProductSearchTerm(term=term, product=product, weight=weight)
+        for term, weight in build_terms(product).items()
+    ])
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Rebuild the whole search index. Returns the number of products indexed.
+    """
+    ProductSearchTerm.objects.all().delete()
+    indexed = 0
+    rows = []
+    products = Product.objects.only('id', 'product_name', 'description').order_by('id')
+    for product in products.iterator(chunk_size=batch_size):
+        rows.extend(
+            ProductSearchTerm(term=term, product=product, weight=weight)
+            for term, weight in build_terms(product).items()
+        )
+        if len(rows) >= batch_size:
+            ProductSearchTerm.objects.bulk_create(rows, batch_size=batch_size)
+            rows = []
+        indexed += 1
+    ProductSearchTerm.objects.bulk_create(rows, batch_size=batch_size)
+    return indexed
+
+
+def search_products(keyword):
+    """
+    Return a queryset of {'product_id', 'rank'} rows for the available products
+    matching every word in 'keyword'. Each word matches as a prefix, so 'shi'
+    finds 'shirt'. Rows are ordered by rank (best first), then newest product.
+
+    The queryset is grouped in the database, so it can be handed straight to a
+    Paginator: only the current page of ids is ever loaded.
+    """
+    terms = list(dict.fromkeys(tokenize(keyword)))
+    if not terms:
+        return ProductSearchTerm.objects.none().values('product_id')
+
+    any_term = Q()
+    for term in terms:
+        any_term |= Q(term__startswith=term)
+
+    # One flag per keyword word: 1 when at least one indexed term of the product matches it.
+    matched = {
+        f'match_{i}': Max(Case(When(term__startswith=term, then=Value(1)), default=Value(0)))
+        for i, term in enumerate(terms)
+    }
+
+    return (
+        ProductSearchTerm.objects
+        .filter(any_term, product__is_available=True)
+        .values('product_id')
+        .annotate(rank=Sum('weight'), **matched)
+        .filter(**{name: 1 for name in matched})
+        .order_by('-rank', '-product_id')
+    )
+
+
+def load_products(rows):
+    """
+    Turn a page of search rows into Product objects, keeping the ranked order.
+    """
+    ids = [row['product_id'] for row in rows]
+    products = Product.objects.in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
@@ -1,3 +1,216 @@
-from django.test import TestCase
+import threading
+import time
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+
+from category.models import Category
+from .inventory import StockLine, deduct_stock
+from .models import Product, Variation, VariationCombination, make_variation_signature
+from .pagination import CursorPage, encode_cursor, paginate_by_cursor
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(category_name='Shirts', slug='shirts')
+        self.products = [
+            Product.objects.create(
+                product_name=f'Shirt {i}', slug=f'shirt-{i}', description='plain', price=10, stock=1,
+                images='photos/products/x.jpg', category=category,
+            )
+            for i in range(8)
+        ]
+
+    def test_cursor_past_the_end_serves_the_last_page(self):
+        cursor = encode_cursor('next', self.products[-1].pk + 100)
+        page = paginate_by_cursor(Product.objects.all(), cursor, 6)
+        self.assertEqual([p.pk for p in page], [p.pk for p in self.products[2:]])
+        self.assertTrue(page.has_previous())
+        self.assertFalse(page.has_next())
+        self.assertIsNotNone(page.previous_cursor)
+
+    @override_settings(STORE_CURSOR_PAGINATION=True)
+    def test_store_page_with_a_cursor_past_the_end(self):
+        cursor = encode_cursor('next', self.products[-1].pk)
+        Product.objects.filter(pk=self.products[-1].pk).update(is_available=False)
+        response = self.client.get('/store/', {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['products']), 6)
+
+    def test_empty_page_has_no_cursors(self):
+        page = CursorPage([], has_previous=True, has_next=True)
+        self.assertIsNone(page.previous_cursor)
+        self.assertIsNone(page.next_cursor)
+
+
+class VariationSignatureTests(TestCase):
+    def test_deleting_a_variation_updates_the_signatures(self):
+        from carts.models import CartItem
+
+        category = Category.objects.create(category_name='Shoes', slug='shoes')
+        product = Product.objects.create(
+            product_name='Shoe', slug='shoe', description='plain', images='photos/products/x.jpg',
+            category=category, product_type='combination',
+        )
+        size = Variation.objects.create(product=product, variation_category='size', variation_value='42')
+        color = Variation.objects.create(product=product, variation_category='color', variation_value='black')
+        combination = VariationCombination.objects.create(product=product, stock=3)
+        combination.variations.set([size, color])
+        item = CartItem.objects.create(product=product, quantity=1)
+        item.variations.set([size, color])
+
+        color.delete()
+
+        combination.refresh_from_db()
+        item.refresh_from_db()
+        self.assertEqual(combination.signature, make_variation_signature([size.pk]))
+        self.assertEqual(item.variation_signature, make_variation_signature([size.pk]))
+
+
+class DeductStockQueryTests(TestCase):
+    """
+    An order takes its stock with the same few queries however many lines it has
+    (one locking SELECT and one CASE UPDATE per table, then the parent totals).
+    """
+    def setUp(self):
+        self.category = Category.objects.create(category_name='Shirts', slug='shirts')
+
+    def make_lines(self, count):
+        defaults = dict(description='plain', images='photos/products/x.jpg', category=self.category)
+        lines = []
+        for i in range(count):
+            simple = Product.objects.create(
+                product_name=f'Cap {count}-{i}', slug=f'cap-{count}-{i}', price=10, stock=5, **defaults
+            )
+            lines.append(StockLine(simple.pk, (), 2))
+
+            with_variations = Product.objects.create(
+                product_name=f'Shirt {count}-{i}', slug=f'shirt-{count}-{i}', product_type='variation', **defaults
+            )
+            red = Variation.objects.create(
+                product=with_variations, variation_category='color', variation_value='red', stock=5
+            )
+            lines.append(StockLine(with_variations.pk, (red.pk,), 2))
+
+            with_combinations = Product.objects.create(
+                product_name=f'Shoe {count}-{i}', slug=f'shoe-{count}-{i}', product_type='combination', **defaults
+            )
+            size = Variation.objects.create(product=with_combinations, variation_category='size', variation_value='42')
+            color = Variation.objects.create(product=with_combinations, variation_category='color', variation_value='black')
+            combination = VariationCombination.objects.create(product=with_combinations, stock=5)
+            combination.variations.set([size, color])
+            lines.append(StockLine(with_combinations.pk, tuple(sorted([size.pk, color.pk])), 2))
+        return lines
+
+    def deduct(self, lines):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(deduct_stock(lines), [])
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_the_lines(self):
+        few = self.deduct(self.make_lines(2))
+        lines = self.make_lines(20)
+        self.assertEqual(self.deduct(lines), few)
+
+        # Every line took 2 of 5, and the parent totals follow
+        product_ids = [line.product_id for line in lines]
+        variations = Variation.objects.filter(product__in=product_ids, product__product_type='variation')
+        combinations = VariationCombination.objects.filter(product__in=product_ids)
+        self.assertEqual(set(Product.objects.filter(pk__in=product_ids).values_list('stock', flat=True)), {3})
+        self.assertEqual(set(variations.values_list('stock', flat=True)), {3})
+        self.assertEqual(set(combinations.values_list('stock', flat=True)), {3})
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class DeductStockConcurrencyTests(TransactionTestCase):
+    """
+    Many checkouts taking the same stock at the same moment must never sell more than there is,
+    and the locks must not make them queue for long.
+    Needs a database with row locks (e.g. PostgreSQL): skipped on SQLite.
+    """
+    CHECKOUTS = 20
+    # All the checkouts of a test must be done within this many seconds (a few ms each when nothing waits)
+    MAX_SECONDS = 5
+
+    def setUp(self):
+        category = Category.objects.create(category_name='Shirts', slug='shirts')
+        defaults = dict(description='plain', images='photos/products/x.jpg', category=category)
+        self.simple = Product.objects.create(product_name='Cap', slug='cap', price=10, stock=7, **defaults)
+        self.other = Product.objects.create(product_name='Belt', slug='belt', price=10, stock=7, **defaults)
+
+        self.with_variations = Product.objects.create(
+            product_name='Shirt', slug='shirt', product_type='variation', **defaults
+        )
+        self.red = Variation.objects.create(
+            product=self.with_variations, variation_category='color', variation_value='red', stock=5
+        )
+
+        self.with_combinations = Product.objects.create(
+            product_name='Shoe', slug='shoe', product_type='combination', **defaults
+        )
+        size = Variation.objects.create(product=self.with_combinations, variation_category='size', variation_value='42')
+        color = Variation.objects.create(product=self.with_combinations, variation_category='color', variation_value='black')
+        self.combination = VariationCombination.objects.create(product=self.with_combinations, stock=3)
+        self.combination.variations.set([size, color])
+        self.combination_ids = tuple(sorted([size.pk, color.pk]))
+
+    def run_checkouts(self, make_lines):
+        """Run CHECKOUTS deduct_stock calls at once (one thread and connection each); return the rejected lines of each."""
+        barrier = threading.Barrier(self.CHECKOUTS)
+        results, errors = [None] * self.CHECKOUTS, []
+
+        def checkout(index):
+            try:
+                barrier.wait()
+                results[index] = deduct_stock(make_lines(index))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=checkout, args=(index,)) for index in range(self.CHECKOUTS)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        self.assertEqual(errors, [])
+        self.assertLess(elapsed, self.MAX_SECONDS, f"{self.CHECKOUTS} checkouts took {elapsed:.2f}s")
+        return results
+
+    def test_simple_product_is_never_oversold(self):
+        results = self.run_checkouts(lambda index: [StockLine(self.simple.pk, (), 1)])
+        self.assertEqual(sum(not rejected for rejected in results), 7)
+        self.simple.refresh_from_db()
+        self.assertEqual(self.simple.stock, 0)
+
+    def test_opposite_line_orders_do_not_deadlock(self):
+        # Half of the orders list the products the other way round: rows are locked in primary key order
+        def make_lines(index):
+            lines = [StockLine(self.simple.pk, (), 1), StockLine(self.other.pk, (), 1)]
+            return lines if index % 2 else lines[::-1]
+
+        self.run_checkouts(make_lines)
+        self.simple.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.simple.stock, self.other.stock), (0, 0))
+
+    def test_variations_and_combinations_are_never_oversold(self):
+        def make_lines(index):
+            if index % 2:
+                return [StockLine(self.with_variations.pk, (self.red.pk,), 1)]
+            return [StockLine(self.with_combinations.pk, self.combination_ids, 1)]
+
+        results = self.run_checkouts(make_lines)
+        self.assertEqual(sum(not rejected for rejected in results), 5 + 3)
+        self.red.refresh_from_db()
+        self.combination.refresh_from_db()
+        self.assertEqual((self.red.stock, self.combination.stock), (0, 0))
+        # The parent totals were recomputed from what is left
+        self.with_variations.refresh_from_db()
+        self.with_combinations.refresh_from_db()
+        self.assertEqual((self.with_variations.stock, self.with_combinations.stock), (0, 0))
@@ -14,4 +14,5 @@ urlpatterns = [
 
     path('category/<slug:category_slug>/<slug:product_slug>', views.product_detail, name='product_detail'),
     path('search/', views.search, name='search'),
+    path('product/<int:product_id>/variations/', views.variation_matrix, name='variation_matrix'),
 ] 
\ No newline at end of file
@@ -0,0 +1,66 @@
+from .models import Variation, VariationCombination
+
+
+def build_variation_matrix(product):
+    """
+    Describe everything a product page needs about a product's variations, in two queries:
+
+        {
+            'categories': [
+                {'name': 'color', 'values': [{'id': 1, 'value': 'red', 'combinations': [5, 6]}, ...]},
+                ...
+            ],
+            'combinations': [
+                {'id': 5, 'variation_ids': [1, 3], 'variations': [{'category': 'color', 'value': 'red'}, ...],
+                 'price': Decimal('12.00') or None, 'stock': 3},
+                ...
+            ],
+        }
+
+    Combinations list their variations through their signature, so no query is made per
+    combination. The result only holds plain data: it can be cached, rendered by the
+    template or returned as JSON for the page's script to resolve availability.
+    """
+    variations = {
+        row['id']: row
+        for row in Variation.objects.filter(product=product).order_by('id').values(
+            'id', 'variation_category', 'variation_value', 'is_active'
+        )
+    }
+
+    categories = {}
+    values = {}
+    for pk, row in variations.items():
+        if not row['is_active']:
+            continue
+        value = {'id': pk, 'value': row['variation_value'], 'combinations': []}
+        categories.setdefault(row['variation_category'], []).append(value)
+        values[pk] = value
+
+    combinations = []
+    rows = VariationCombination.objects.filter(product=product, is_active=True).order_by('id').values_list(
+        'id', 'signature', 'price', 'stock'
+    )
+    for pk, signature, price, stock in rows:
+        variation_ids = [int(v) for v in signature.split('-') if v]
+        for variation_id in variation_ids:
+            if variation_id in values:
+                values[variation_id]['combinations'].append(pk)
+        combinations.append({
+            'id': pk,
+            'variation_ids': variation_ids,
+            'variations': [
+                {
+                    'category': variations[variation_id]['variation_category'],
+                    'value': variations[variation_id]['variation_value'],
+                }
+                for variation_id in variation_ids if variation_id in variations
+            ],
+            'price': price,
+            'stock': stock,
+        })
+
+    return {
+        'categories': [{'name': name, 'values': category_values} for name, category_values in categories.items()],
+        'combinations': combinations,
+    }
@@ -1,10 +1,14 @@
 from django.shortcuts import render, get_object_or_404
-from store.models import Product, VariationCombination
+from django.http import JsonResponse
+from store.models import Product
 from category.models import Category
 from carts.models import CartItem
 from carts.views import _cart_id
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.conf import settings
+from .search import search_products, load_products
+from .page_cache import product_cache_version, get_variation_matrix
+from .pagination import paginate_by_cursor, cached_count
 
 # Only show single products (no variations or combinations) in the store listing
 def store(request, category_slug=None):
@@ -12,16 +16,23 @@ def store(request, category_slug=None):
     products = None
     if category_slug:
         categories = get_object_or_404(Category, slug=category_slug)
-        products = Product.objects.filter(category=categories, is_available=True)
+        products = Product.objects.filter(category=categories, is_available=True).order_by('id')
     else:
         products = Product.objects.filter(is_available=True).order_by('id')
 
     # Exclude products that are only variation combinations
     # (Assumes VariationCombination is not shown in Product table)
-    paginator = Paginator(products, 6 if not category_slug else 6)
-    page = request.GET.get('page')
-    paged_products = paginator.get_page(page)
-    product_count = products.count()
+    if settings.STORE_CURSOR_PAGINATION:
+        # Cursor pagination: '?cursor=...' marks where the page starts, so every page is one indexed range query
+        # (no COUNT(*) and no OFFSET). The "items found" total comes from the cache and may lag a few minutes.
+        paged_products = paginate_by_cursor(products, request.GET.get('cursor'), 6)
+        product_count = cached_count(products, f"product_count:{categories.id if categories else 'all'}")
+    else:
+        paginator = Paginator(products, 6 if not category_slug else 6)
+        page = request.GET.get('page')
+        paged_products = paginator.get_page(page)
+        # The paginator has already counted the products, reuse its count instead of running COUNT(*) again
+        product_count = paginator.count
 
     context = {
         'products': paged_products,
@@ -32,43 +43,49 @@ def store(request, category_slug=None):
 def product_detail(request, category_slug, product_slug):
     try:
         single_product = Product.objects.get(category__slug=category_slug, slug=product_slug)
-        in_cart = CartItem.objects.filter(cart__cart_id=_cart_id(request), product=single_product).exists()
+        # Visitors without a guest cart yet can't have the product in it: no query (and no session) needed
+        cart_id = _cart_id(request)
+        in_cart = bool(cart_id) and CartItem.objects.filter(cart__cart_id=cart_id, product=single_product).exists()
 
-        # Get variations and variation combinations for this product
-        variations = single_product.variation_set.filter(is_active=True)
-        variation_combinations = VariationCombination.objects.filter(product=single_product, is_active=True)
+        # The parts of the page that are the same for every visitor are cached until the product changes.
+        # 'product_cache_version' is part of their cache keys (see 'store/page_cache.py').
+        cache_version = product_cache_version(single_product.pk)
 
-        # Get unique variation categories for template use
-        variation_categories = variations.values_list('variation_category', flat=True).distinct()
+        # Variation categories, their values and the available combinations, built in a fixed number of queries and cached
+        variation_matrix = get_variation_matrix(single_product, cache_version)
 
     except Product.DoesNotExist:
         single_product = None
         in_cart = False
-        variations = []
-        variation_combinations = []
-        variation_categories = []
+        cache_version = None
+        variation_matrix = {'categories': [], 'combinations': []}
 
     context = {
         'single_product': single_product,
         'in_cart': in_cart,
-        'variations': variations,
-        'variation_combinations': variation_combinations,
-        'variation_categories': variation_categories,
+        'product_cache_version': cache_version,
+        'variation_matrix': variation_matrix,
     }
     return render(request, 'stores/product_detail.html', context)
 
+
+# The same variation matrix as JSON, so the product page can check availability without reloading
+def variation_matrix(request, product_id):
+    product = get_object_or_404(Product, id=product_id)
+    return JsonResponse(get_variation_matrix(product))
+
 def search(request):
     context = {}
     if 'keyword' in request.GET:
         keyword = request.GET['keyword']
         if keyword:
-            products = Product.objects.order_by('-created_date').filter(
-                Q(description__icontains=keyword) | Q(product_name__icontains=keyword),
-                is_available=True
-            )
-            product_count = products.count()
+            # Look the keyword up in the search index instead of scanning every product's text
+            paginator = Paginator(search_products(keyword), 6)
+            paged_products = paginator.get_page(request.GET.get('page'))
+            paged_products.object_list = load_products(paged_products.object_list)
             context = {
-                'products': products,
-                'product_count': product_count,
+                'products': paged_products,
+                'product_count': paginator.count,
+                'keyword': keyword,
             }
-    return render(request, 'stores/store.html', context)
\ No newline at end of file
+    return render(request, 'stores/store.html', context)